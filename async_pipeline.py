@@ -0,0 +1,124 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+# Appels simultanés autorisés par étape ; au-delà, les demandes attendent leur tour
+LLM_CONCURRENCY = int(os.environ.get("LLM_CONCURRENCY", "16"))
+DB_CONCURRENCY = int(os.environ.get("DB_CONCURRENCY", "8"))
+# Travaux longs (exports, imports) : étape et threads à part, pour ne pas priver les requêtes interactives
+JOB_CONCURRENCY = int(os.environ.get("JOB_CONCURRENCY", "2"))
+# File d'attente Gradio : événements traités en parallèle et taille maximale de la file
+GRADIO_CONCURRENCY_LIMIT = int(os.environ.get("GRADIO_CONCURRENCY_LIMIT", "64"))
+GRADIO_MAX_QUEUE = int(os.environ.get("GRADIO_MAX_QUEUE", "256"))
+
+
+class Stage:
+    """Étape du pipeline bornée par un sémaphore, avec ses compteurs d'attente et d'exécution"""
+
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        self._semaphore = asyncio.Semaphore(limit)
+        self._lock = threading.Lock()
+        self.stats = {
+            "waiting": 0,
+            "active": 0,
+            "max_waiting": 0,
+            "completed": 0,
+            "wait_seconds": 0.0,
+            "run_seconds": 0.0,
+        }
+
+    @asynccontextmanager
+    async def slot(self):
+        debut = time.perf_counter()
+        with self._lock:
+            self.stats["waiting"] += 1
+            self.stats["max_waiting"] = max(self.stats["max_waiting"], self.stats["waiting"])
+        try:
+            await self._semaphore.acquire()
+        finally:
+            with self._lock:
+                self.stats["waiting"] -= 1
+        entree = time.perf_counter()
+        with self._lock:
+            self.stats["active"] += 1
+            self.stats["wait_seconds"] += entree - debut
+        try:
+            yield
+        finally:
+            self._semaphore.release()
+            with self._lock:
+                self.stats["active"] -= 1
+                self.stats["completed"] += 1
+                self.stats["run_seconds"] += time.perf_counter() - entree
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        done = stats["completed"] or 1
+        return {
+            **stats,
+            "limit": self.limit,
+            "mean_wait_ms": 1000 * stats["wait_seconds"] / done,
+            "mean_run_ms": 1000 * stats["run_seconds"] / done,
+        }
+
+
+STAGES = {
+    "llm": Stage("llm", LLM_CONCURRENCY),
+    "db": Stage("db", DB_CONCURRENCY),
+    "jobs": Stage("jobs", JOB_CONCURRENCY),
+}
+
+# Le travail MySQL (bloquant) quitte la boucle d'événements pour ces pools de threads
+_db_executor = ThreadPoolExecutor(max_workers=DB_CONCURRENCY, thread_name_prefix="db")
+_job_executor = ThreadPoolExecutor(max_workers=JOB_CONCURRENCY, thread_name_prefix="job")
+
+
+async def _run_in(stage, executor, fn, *args, **kwargs):
+    # Les contextvars sont copiées (comme asyncio.to_thread) : gr.Progress lit
+    # l'évènement Gradio en cours dans LocalContext
+    async with stage.slot():
+        loop = asyncio.get_running_loop()
+        contexte = contextvars.copy_context()
+        return await loop.run_in_executor(executor, functools.partial(contexte.run, fn, *args, **kwargs))
+
+
+async def run_db(fn, *args, **kwargs):
+    """Exécuter une fonction bloquante de base de données dans le pool dédié"""
+    return await _run_in(STAGES["db"], _db_executor, fn, *args, **kwargs)
+
+
+async def run_job(fn, *args, **kwargs):
+    """Comme run_db, pour les travaux longs (exports, imports), dans l'étape "jobs" """
+    return await _run_in(STAGES["jobs"], _job_executor, fn, *args, **kwargs)
+
+
+def db_handler(fn):
+    """Transformer un gestionnaire Gradio synchrone en coroutine exécutée par run_db.
+
+    La signature est conservée (functools.wraps) : Gradio continue d'injecter
+    gr.Request et gr.Progress.
+    """
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await run_db(fn, *args, **kwargs)
+    return wrapper
+
+
+def job_handler(fn):
+    """Comme db_handler, pour un gestionnaire de travail long (run_job)"""
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await run_job(fn, *args, **kwargs)
+    return wrapper
+
+
+def stage_stats():
+    return {name: stage.snapshot() for name, stage in STAGES.items()}
@@ -0,0 +1,282 @@
+# Mode batch sans interface : une banque de questions passe par la chaîne NL→SQL en parallèle.
+#
+#   python batch.py questions.jsonl resultats.jsonl --mysql-user root --db shop --execute
+#   python batch.py questions.jsonl resultats.jsonl --model llama-3.3-70b-versatile --workers 16 --min-match 0.9
+#
+# Une ligne d'entrée : {"id": "q1", "question": "...", "expected_sql": "...", "db": "shop"}
+# ("id", "expected_sql" et "db" sont facultatifs ; "db" remplace --db pour cette question).
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from decimal import Decimal
+
+
+def lire_questions(path):
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for numero, ligne in enumerate(f, 1):
+            ligne = ligne.strip()
+            if not ligne:
+                continue
+            item = json.loads(ligne)
+            if isinstance(item, str):
+                item = {"question": item}
+            if not item.get("question"):
+                raise ValueError(f"ligne {numero} : champ \"question\" manquant")
+            item.setdefault("id", str(numero))
+            questions.append(item)
+    return questions
+
+
+def normaliser_sql(sql):
+    return " ".join((sql or "").split()).rstrip(";").strip().lower()
+
+
+def _valeur(v):
+    if isinstance(v, (int, float, Decimal)) and not isinstance(v, bool):
+        return round(float(v), 6)
+    return None if v is None else str(v)
+
+
+def lignes_comparables(resultat, ordonne):
+    """Lignes normalisées (noms de colonnes ignorés) ; triées si l'ordre n'est pas imposé"""
+    lignes = [tuple(_valeur(v) for v in row) for row in resultat["rows"]]
+    return lignes if ordonne else sorted(lignes, key=repr)
+
+
+def _ordonne(sql):
+    return re.search(r"\bORDER\s+BY\b", sql, re.IGNORECASE) is not None
+
+
+class Pipeline:
+    def __init__(self, args):
+        # Import différé : la configuration (variables d'environnement) est fixée dans main()
+        from column_profiles import get_profile, refresh_profile, render_profile
+        from groq_functions import call_groq, clear_conversation, extract_sql_query
+        from groq_scheduler import PRIORITY_BATCH
+        from mysql_functions import executer_requete_resultat
+        from schema_cache import get_schema_model, render_schema_prompt
+        from schema_pruning import prune_schema
+        from sql_classifier import DDL, READ, WRITE, classify_script
+
+        self.call_groq = call_groq
+        self.clear_conversation = clear_conversation
+        self.extract_sql_query = extract_sql_query
+        self.executer = executer_requete_resultat
+        self.get_schema_model = get_schema_model
+        self.render_schema_prompt = render_schema_prompt
+        self.prune_schema = prune_schema
+        self.classify_script = classify_script
+        self.get_profile = get_profile
+        self.refresh_profile = refresh_profile
+        self.render_profile = render_profile
+        self._profils = set()
+        self._profils_lock = threading.Lock()
+        self.READ = READ
+        self.WRITE = WRITE
+        self.DDL = DDL
+        self.priority = PRIORITY_BATCH
+        self.args = args
+        self.role = _lire_texte(args.role)
+        self.rules = _lire_texte(args.rules)
+
+    def prompt(self, question, db_name):
+        if not db_name:
+            return self.clear_conversation("", self.role, self.rules)
+        a = self.args
+        model = self.get_schema_model(a.mysql_host, a.mysql_user, a.mysql_password, db_name)
+        schema = self.render_schema_prompt(model) if a.no_prune else self.prune_schema(model, question)
+        return self.clear_conversation(schema, self.role, self.rules, self.profil(db_name, model, schema))
+
+    def profil(self, db_name, model, schema):
+        """Profil des colonnes des tables présentes dans le schéma envoyé, calculé une fois par base"""
+        a = self.args
+        if a.no_profile:
+            return ""
+        with self._profils_lock:
+            if db_name not in self._profils:
+                try:
+                    self.refresh_profile(a.mysql_host, a.mysql_user, a.mysql_password, db_name,
+                                         max_tables=len(model["tables"]))
+                except Exception as e:
+                    print(f"Profil de {db_name} indisponible : {e}", file=sys.stderr)
+                self._profils.add(db_name)
+        tables = set(re.findall(r"^TABLE (.+):$", schema, re.M))
+        return self.render_profile(self.get_profile(a.mysql_host, a.mysql_user, db_name), tables)
+
+    def executer_sql(self, db_name, sql):
+        """Exécuter un script ; retourne le résultat de la dernière instruction.
+
+        Comme dans l'interface, structures (DDL) et instructions inconnues sont
+        toujours refusées ; les écritures ne passent qu'avec --allow-writes.
+        """
+        a = self.args
+        script = self.classify_script(sql)
+        for _, kind in script:
+            if kind not in (self.READ, self.WRITE):
+                nature = "modification de structure" if kind == self.DDL else "instruction non reconnue"
+                return {"error": f"{nature} refusée : seules les lectures et écritures de données sont autorisées",
+                        "skipped": True}
+        if not a.allow_writes and any(kind != self.READ for _, kind in script):
+            return {"error": "instruction non lecture ignorée (--allow-writes pour l'exécuter)", "skipped": True}
+        resultat = None
+        for statement, _ in script:
+            resultat = self.executer(a.mysql_host, a.mysql_user, a.mysql_password, db_name, statement,
+                                     limite=a.max_rows, compter=False)
+            if resultat["error"]:
+                break
+        return resultat
+
+    def traiter(self, index, item):
+        a = self.args
+        db_name = item.get("db") or a.db
+        expected = item.get("expected_sql")
+        record = {"index": index, "id": item["id"], "question": item["question"], "db": db_name,
+                  "model": a.model, "response": None, "sql": None, "expected_sql": expected,
+                  "exact_match": None, "executed": False, "execution_match": None,
+                  "rows": None, "error": None, "timings_ms": {}}
+        timings = record["timings_ms"]
+        debut = time.perf_counter()
+
+        def chrono(etape, depart):
+            timings[etape] = round(1000 * (time.perf_counter() - depart), 1)
+
+        try:
+            t = time.perf_counter()
+            messages = self.prompt(item["question"], db_name)
+            messages.append({"role": "user", "content": item["question"]})
+            chrono("prompt", t)
+
+            t = time.perf_counter()
+            reponse, historique = self.call_groq(messages, a.api_key, a.model, a.temperature, priority=self.priority)
+            chrono("llm", t)
+            record["response"] = reponse
+            if historique[-1]["role"] != "assistant":
+                record["error"] = reponse
+                return record
+
+            sql = self.extract_sql_query(reponse)
+            record["sql"] = sql
+            if sql and expected:
+                record["exact_match"] = normaliser_sql(sql) == normaliser_sql(expected)
+
+            if a.execute and sql and db_name:
+                t = time.perf_counter()
+                obtenu = self.executer_sql(db_name, sql)
+                chrono("sql", t)
+                record["executed"] = not obtenu.get("skipped")
+                if obtenu.get("error"):
+                    record["error"] = obtenu["error"]
+                else:
+                    record["rows"] = len(obtenu["rows"])
+                    if expected:
+                        t = time.perf_counter()
+                        attendu = self.executer_sql(db_name, expected)
+                        chrono("expected_sql", t)
+                        if attendu.get("error"):
+                            record["error"] = f"SQL attendu : {attendu['error']}"
+                        else:
+                            ordonne = _ordonne(expected)
+                            record["execution_match"] = (lignes_comparables(obtenu, ordonne)
+                                                         == lignes_comparables(attendu, ordonne))
+                            if obtenu["has_more"] or attendu["has_more"]:
+                                record["truncated"] = True
+        except Exception as e:
+            record["error"] = str(e)
+        finally:
+            chrono("total", debut)
+        return record
+
+
+def _lire_texte(path):
+    if not path:
+        return ""
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def resume(records, duree):
+    def taux(cle):
+        valeurs = [r[cle] for r in records if r[cle] is not None]
+        return (sum(valeurs), len(valeurs))
+
+    llm = sorted(r["timings_ms"].get("llm", 0) for r in records)
+    stats = {
+        "questions": len(records),
+        "errors": sum(1 for r in records if r["error"]),
+        "sql_extracted": sum(1 for r in records if r["sql"]),
+        "executed": sum(1 for r in records if r["executed"]),
+        "exact_match": taux("exact_match"),
+        "execution_match": taux("execution_match"),
+        "llm_p50_ms": llm[len(llm) // 2] if llm else 0,
+        "llm_p95_ms": llm[min(len(llm) - 1, int(len(llm) * 0.95))] if llm else 0,
+        "seconds": round(duree, 1),
+    }
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Passer une banque de questions par la chaîne NL→SQL")
+    parser.add_argument("input", help="questions au format JSONL")
+    parser.add_argument("output", help="résultats au format JSONL (une ligne par question)")
+    parser.add_argument("--api-key", default=os.environ.get("GROQ_API_KEY", ""),
+                        help="clé(s) API Groq séparées par des virgules (défaut : $GROQ_API_KEY)")
+    parser.add_argument("--model", default="llama-3.1-8b-instant")
+    parser.add_argument("--temperature", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=8, help="questions traitées en parallèle")
+    parser.add_argument("--mysql-host", default="localhost")
+    parser.add_argument("--mysql-user", default="root")
+    parser.add_argument("--mysql-password", default="")
+    parser.add_argument("--db", default="", help="base utilisée pour le schéma et l'exécution")
+    parser.add_argument("--execute", action="store_true", help="exécuter le SQL généré (et le SQL attendu)")
+    parser.add_argument("--allow-writes", action="store_true", help="exécuter aussi les instructions d'écriture")
+    parser.add_argument("--max-rows", type=int, default=10000, help="lignes lues par requête pour la comparaison")
+    parser.add_argument("--no-prune", action="store_true", help="envoyer le schéma complet au lieu du schéma réduit")
+    parser.add_argument("--no-profile", action="store_true", help="ne pas ajouter le profil des colonnes au prompt")
+    parser.add_argument("--role", help="fichier contenant le rôle personnalisé")
+    parser.add_argument("--rules", help="fichier contenant les règles personnalisées")
+    parser.add_argument("--min-match", type=float,
+                        help="code de sortie 1 si le taux de correspondance d'exécution est inférieur")
+    args = parser.parse_args(argv)
+
+    # La configuration est lue à l'import des modules : à fixer avant.
+    # Un lot de nuit peut attendre son tour derrière les limites de débit plutôt qu'échouer.
+    os.environ.setdefault("GROQ_MAX_WAIT", "600")
+    os.environ.setdefault("MYSQL_POOL_SIZE", str(max(5, args.workers)))
+    os.environ.setdefault("GROQ_HTTP_POOL_SIZE", str(max(20, args.workers)))
+
+    questions = lire_questions(args.input)
+    pipeline = Pipeline(args)
+    records = []
+    debut = time.perf_counter()
+    with open(args.output, "w", encoding="utf-8") as out, ThreadPoolExecutor(args.workers) as pool:
+        futures = [pool.submit(pipeline.traiter, index, item) for index, item in enumerate(questions)]
+        for future in as_completed(futures):
+            record = future.result()
+            records.append(record)
+            # Écrit au fil de l'eau : un lot interrompu garde les résultats déjà obtenus
+            out.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            out.flush()
+            print(f"\r{len(records)}/{len(questions)}", end="", file=sys.stderr, flush=True)
+
+    stats = resume(records, time.perf_counter() - debut)
+    print(file=sys.stderr)
+    for cle, valeur in stats.items():
+        if isinstance(valeur, tuple):
+            valeur = f"{valeur[0]}/{valeur[1]}" + (f" ({100 * valeur[0] / valeur[1]:.1f} %)" if valeur[1] else "")
+        print(f"{cle:<16} {valeur}", file=sys.stderr)
+
+    if args.min_match is not None:
+        bons, total = stats["execution_match"]
+        if not total or bons / total < args.min_match:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
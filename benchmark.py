@@ -0,0 +1,421 @@
+# Banc d'essai de bout en bout : faux serveur LLM local + base MySQL de test générée.
+#
+#   python benchmark.py --mysql-host localhost --mysql-user root --save-baseline bench.json
+#   python benchmark.py --mysql-user root --baseline bench.json --concurrency 1,8,32
+#   python benchmark.py fake-server --port 8800 --latency 0.2 --token-rate 200
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# ---------------------------------------------------------------------------
+# Faux serveur compatible OpenAI (latence et débit de tokens réglables)
+# ---------------------------------------------------------------------------
+
+def make_handler(latency, token_rate, reply):
+    class FakeOpenAIHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            prompt_tokens = sum(len(m["content"]) for m in body["messages"]) // 4
+            tokens = [reply[i:i + 4] for i in range(0, len(reply), 4)]
+            time.sleep(latency)
+            if body.get("stream"):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for token in tokens:
+                    self._chunk("data: " + json.dumps({"choices": [{"delta": {"content": token}}]}) + "\n\n")
+                    time.sleep(1 / token_rate)
+                self._chunk("data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+            else:
+                time.sleep(len(tokens) / token_rate)
+                payload = json.dumps({
+                    "choices": [{"message": {"content": reply}}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                              "total_tokens": prompt_tokens + len(tokens)},
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        def _chunk(self, text):
+            data = text.encode()
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+    return FakeOpenAIHandler
+
+
+def start_fake_server(port, latency, token_rate, reply):
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(latency, token_rate, reply))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def fake_reply(table, rows):
+    return ("Voici la requête demandée :\n\n```sql\n"
+            f"SELECT * FROM {table} ORDER BY id LIMIT {rows};\n```\n\n"
+            "Elle renvoie les premières lignes de la table, triées par identifiant.")
+
+
+# ---------------------------------------------------------------------------
+# Base de test : `tables` tables chaînées par clé étrangère, générées à partir d'une graine
+# ---------------------------------------------------------------------------
+
+def fixture_name(tables, rows):
+    return f"bench_{tables}t_{rows}r"
+
+
+def create_fixture(host, user, password, tables, rows, seed):
+    """Créer (ou réutiliser si identique) la base de test ; retourne son nom.
+
+    La table t0 reçoit `rows` lignes, les autres quelques lignes : le nombre
+    de tables fait varier la taille du schéma, `rows` celle des résultats.
+    """
+    import mysql.connector
+
+    db_name = fixture_name(tables, rows)
+    conn = mysql.connector.connect(host=host, user=user, password=password)
+    cur = conn.cursor()
+    cur.execute("SHOW DATABASES LIKE %s", (db_name,))
+    if cur.fetchone():
+        cur.execute(f"SELECT seed FROM `{db_name}`.`_bench_meta`")
+        meta = cur.fetchone()
+        if meta and meta[0] == seed:
+            cur.close()
+            conn.close()
+            return db_name
+        cur.execute(f"DROP DATABASE `{db_name}`")
+
+    rng = random.Random(seed)
+    cur.execute(f"CREATE DATABASE `{db_name}`")
+    cur.execute(f"USE `{db_name}`")
+    for t in range(tables):
+        reference = f", parent_id INT NULL, FOREIGN KEY (parent_id) REFERENCES t{t - 1}(id)" if t else ""
+        cur.execute(
+            f"CREATE TABLE t{t} (id INT PRIMARY KEY AUTO_INCREMENT, nom VARCHAR(64) NOT NULL, "
+            f"categorie ENUM('a','b','c','d') NOT NULL, montant DECIMAL(10,2), cree_le DATETIME"
+            f"{reference}) COMMENT 'table de test {t}'"
+        )
+        nombre = rows if t == 0 else 10
+        colonnes = "nom, categorie, montant, cree_le" + (", parent_id" if t else "")
+        marqueurs = "%s, %s, %s, %s" + (", %s" if t else "")
+        for debut in range(0, nombre, 5000):
+            lot = []
+            for i in range(debut, min(nombre, debut + 5000)):
+                ligne = (f"element-{t}-{i}", rng.choice("abcd"), round(rng.uniform(0, 10000), 2),
+                         f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:00:00")
+                lot.append(ligne + ((rng.randint(1, 10),) if t else ()))
+            cur.executemany(f"INSERT INTO t{t} ({colonnes}) VALUES ({marqueurs})", lot)
+        conn.commit()
+    cur.execute("CREATE TABLE _bench_meta (seed INT)")
+    cur.execute("INSERT INTO _bench_meta VALUES (%s)", (seed,))
+    conn.commit()
+    cur.close()
+    conn.close()
+    return db_name
+
+
+# ---------------------------------------------------------------------------
+# Mesures
+# ---------------------------------------------------------------------------
+
+def percentile(values, p):
+    """Percentile au rang le plus proche"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+def peak_rss_mb():
+    # ru_maxrss est en kio sous Linux, en octets sous macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def current_rss_mb():
+    """RSS courant (Linux : /proc/self/statm) ; None si indisponible"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+class RssSampler:
+    """Croissance du RSS pendant un scénario : pic échantillonné moins RSS au départ.
+
+    ru_maxrss est un maximum depuis le démarrage du processus, partagé par tous
+    les scénarios ; il ne sert que de repli là où /proc est absent (macOS).
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.delta_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self._peak = max(self._peak, current_rss_mb())
+
+    def __enter__(self):
+        self._start = current_rss_mb()
+        if self._start is None:
+            self._start = peak_rss_mb()
+            return self
+        self._peak = self._start
+        self._thread = threading.Thread(target=self._sample, name="rss-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self._thread is None:
+            self.delta_mb = max(0.0, peak_rss_mb() - self._start)
+            return
+        self._stop.set()
+        self._thread.join()
+        self.delta_mb = max(self._peak, current_rss_mb()) - self._start
+
+
+def summarize(latencies, wall, errors, rss_delta_mb):
+    return {
+        "ops": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / wall if wall else 0.0,
+        "p50_ms": 1000 * percentile(latencies, 50),
+        "p95_ms": 1000 * percentile(latencies, 95),
+        "p99_ms": 1000 * percentile(latencies, 99),
+        "rss_delta_mb": rss_delta_mb,
+    }
+
+
+def run_threads(fn, concurrency, iterations):
+    """Exécuter `fn()` `iterations` fois avec `concurrency` threads ; fn retourne False en cas d'erreur"""
+    latencies, errors = [], 0
+
+    def one():
+        debut = time.perf_counter()
+        ok = fn()
+        return time.perf_counter() - debut, ok
+
+    debut = time.perf_counter()
+    with RssSampler() as rss, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for latency, ok in pool.map(lambda _: one(), range(iterations)):
+            latencies.append(latency)
+            errors += 0 if ok is not False else 1
+    return summarize(latencies, time.perf_counter() - debut, errors, rss.delta_mb)
+
+
+# Une seule boucle pour tous les scénarios asynchrones, comme sous Gradio
+# (les sémaphores du pipeline restent liés à la boucle qui les a utilisés)
+_loop = None
+
+
+def run_coroutines(make_coro, concurrency, iterations):
+    """Même mesure pour une coroutine : `concurrency` tâches simultanées sur la boucle partagée"""
+    global _loop
+    latencies, errors = [], 0
+
+    async def worker(compteur):
+        nonlocal errors
+        while next(compteur) < iterations:
+            debut = time.perf_counter()
+            ok = await make_coro()
+            latencies.append(time.perf_counter() - debut)
+            errors += 0 if ok is not False else 1
+
+    async def main():
+        compteur = iter(range(iterations + concurrency))
+        await asyncio.gather(*(worker(compteur) for _ in range(concurrency)))
+
+    if _loop is None:
+        _loop = asyncio.new_event_loop()
+    debut = time.perf_counter()
+    with RssSampler() as rss:
+        _loop.run_until_complete(main())
+    return summarize(latencies, time.perf_counter() - debut, errors, rss.delta_mb)
+
+
+# ---------------------------------------------------------------------------
+# Scénarios
+# ---------------------------------------------------------------------------
+
+def scenarios(args, db_names):
+    """(identifiant, type, fonction) pour chaque combinaison demandée"""
+    from groq_functions import clear_conversation, format_resultat
+    from mysql_functions import executer_requete, executer_requete_resultat, get_db_schema, groq_chat_interface
+    from result_frames import resultat_dataframe
+    from schema_cache import invalidate_schema
+
+    host, user, password = args.mysql_host, args.mysql_user, args.mysql_password
+
+    for tables, db_name in db_names.items():
+        def schema_froid(db_name=db_name):
+            invalidate_schema(host, db_name)
+            return not get_db_schema(host, user, password, db_name).startswith("Erreur")
+
+        def schema_chaud(db_name=db_name):
+            return not get_db_schema(host, user, password, db_name).startswith("Erreur")
+
+        yield f"get_db_schema[froid,tables={tables}]", "threads", schema_froid
+        yield f"get_db_schema[chaud,tables={tables}]", "threads", schema_chaud
+
+    db_name = db_names[min(db_names)]
+    for size in args.result_sizes:
+        requete = f"SELECT * FROM t0 ORDER BY id LIMIT {size}"
+
+        def requete_sql(requete=requete):
+            return not executer_requete(host, user, password, db_name, requete).startswith("Erreur")
+
+        resultat = executer_requete_resultat(host, user, password, db_name, requete, limite=None)
+
+        def formatage(resultat=resultat):
+            return bool(format_resultat(resultat))
+
+        def dataframe(resultat=resultat):
+            return len(resultat_dataframe(resultat)) == len(resultat["rows"])
+
+        yield f"executer_requete[lignes={size}]", "threads", requete_sql
+        yield f"format_resultat[lignes={size}]", "threads", formatage
+        yield f"resultat_dataframe[lignes={size}]", "threads", dataframe
+
+    mysql_config = {"host": host, "user": user, "password": password, "db_name": db_name}
+    schema = get_db_schema(host, user, password, db_name)
+
+    async def chat():
+        history = []
+        async for history, *_ in groq_chat_interface(
+            "Montre-moi les premières lignes de t0", [], "bench", args.model, 0.0,
+            clear_conversation(schema), True, mysql_config, stream=True
+        ):
+            pass
+        return bool(history) and "Erreur" not in history[-1][1][:20]
+
+    yield f"groq_chat_interface[lignes={args.chat_rows}]", "async", chat
+
+
+def compare(results, baseline, tolerance):
+    """Afficher les écarts avec la référence ; retourne le nombre de régressions"""
+    regressions = 0
+    print(f"\nComparaison avec la référence (tolérance {tolerance:.0f} %)")
+    for key, current in results.items():
+        ref = baseline.get(key)
+        if not ref:
+            continue
+        ecarts = []
+        for metric, plus_haut_est_mieux in (("throughput", True), ("p50_ms", False), ("p95_ms", False), ("p99_ms", False)):
+            if not ref[metric]:
+                continue
+            delta = 100 * (current[metric] - ref[metric]) / ref[metric]
+            regression = delta < -tolerance if plus_haut_est_mieux else delta > tolerance
+            regressions += regression
+            ecarts.append(f"{metric} {delta:+.1f}%{' ⚠' if regression else ''}")
+        print(f"  {key:<60} {'  '.join(ecarts)}")
+    return regressions
+
+
+def parse_list(text):
+    return [int(x) for x in text.split(",") if x.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banc d'essai de l'assistant SQL")
+    parser.add_argument("command", nargs="?", default="run", choices=["run", "fake-server"])
+    parser.add_argument("--port", type=int, default=8800, help="port du faux serveur LLM")
+    parser.add_argument("--latency", type=float, default=0.2, help="latence avant le premier token (s)")
+    parser.add_argument("--token-rate", type=float, default=200, help="tokens produits par seconde")
+    parser.add_argument("--mysql-host", default="localhost")
+    parser.add_argument("--mysql-user", default="root")
+    parser.add_argument("--mysql-password", default="")
+    parser.add_argument("--tables", type=parse_list, default=[10, 100], help="tailles de schéma (nombre de tables)")
+    parser.add_argument("--rows", type=int, default=100000, help="lignes de la table t0")
+    parser.add_argument("--result-sizes", type=parse_list, default=[10, 1000, 50000])
+    parser.add_argument("--chat-rows", type=int, default=50, help="LIMIT de la requête renvoyée par le faux LLM")
+    parser.add_argument("--concurrency", type=parse_list, default=[1, 8, 32])
+    parser.add_argument("--iterations", type=int, default=50, help="opérations par scénario et par niveau")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--model", default="llama-3.1-8b-instant")
+    parser.add_argument("--with-cache", action="store_true", help="garder les caches LLM et résultats actifs")
+    parser.add_argument("--save-baseline", help="enregistrer les résultats comme référence (JSON)")
+    parser.add_argument("--baseline", help="comparer à une référence enregistrée")
+    parser.add_argument("--tolerance", type=float, default=10.0, help="écart toléré en %% avant régression")
+    args = parser.parse_args(argv)
+
+    reply = fake_reply("t0", args.chat_rows)
+    if args.command == "fake-server":
+        server = start_fake_server(args.port, args.latency, args.token_rate, reply)
+        print(f"Faux serveur LLM sur http://127.0.0.1:{args.port}/v1/chat/completions")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
+        return 0
+
+    # La configuration est lue à l'import des modules : à fixer avant
+    os.environ["GROQ_API_URL"] = f"http://127.0.0.1:{args.port}/v1/chat/completions"
+    os.environ.setdefault("GROQ_RPM", "1000000")
+    os.environ.setdefault("GROQ_TPM", "1000000000")
+    os.environ.setdefault("LLM_CONCURRENCY", str(max(args.concurrency)))
+    if not args.with_cache:
+        os.environ["LLM_CACHE_ENABLED"] = "0"
+        os.environ["RESULT_CACHE_ENABLED"] = "0"
+
+    start_fake_server(args.port, args.latency, args.token_rate, reply)
+    db_names = {}
+    for tables in args.tables:
+        print(f"Préparation de la base de test ({tables} tables, {args.rows} lignes)…", flush=True)
+        db_names[tables] = create_fixture(args.mysql_host, args.mysql_user, args.mysql_password,
+                                          tables, args.rows, args.seed)
+
+    results = {}
+    print(f"\n{'scénario':<60} {'conc.':>5} {'ops/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ΔRSS Mo':>8} {'err.':>5}")
+    for name, kind, fn in scenarios(args, db_names):
+        for concurrency in args.concurrency:
+            if kind == "threads":
+                stats = run_threads(fn, concurrency, args.iterations)
+            else:
+                stats = run_coroutines(fn, concurrency, args.iterations)
+            key = f"{name}@{concurrency}"
+            results[key] = stats
+            print(f"{name:<60} {concurrency:>5} {stats['throughput']:>9.1f} {stats['p50_ms']:>9.1f} "
+                  f"{stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f} {stats['rss_delta_mb']:>8.1f} {stats['errors']:>5}",
+                  flush=True)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({"params": {k: v for k, v in vars(args).items() if k not in ("mysql_password",)},
+                       "results": results}, f, indent=2)
+        print(f"\nRéférence enregistrée dans {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        if compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+import csv
+import os
+import shutil
+import tempfile
+import time
+import unicodedata
+
+from mysql_pool import connexion
+
+IMPORT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", "5000"))
+
+MODE_INSERT = "INSERT par lots"
+MODE_LOAD_DATA = "LOAD DATA LOCAL INFILE"
+
+
+def _normaliser(nom):
+    nom = unicodedata.normalize("NFKD", str(nom).strip().lower())
+    nom = "".join(c for c in nom if not unicodedata.combining(c))
+    return "".join(c if c.isalnum() else "_" for c in nom).strip("_")
+
+
+def _quote(identifiant):
+    return "`" + str(identifiant).replace("`", "``") + "`"
+
+
+def _est_excel(path):
+    # .xlsx seulement : openpyxl ne lit pas l'ancien format .xls
+    return str(path).lower().endswith(".xlsx")
+
+
+def _detecter_separateur(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        echantillon = f.read(64 * 1024)
+    try:
+        return csv.Sniffer().sniff(echantillon, delimiters=",;\t|").delimiter
+    except csv.Error:
+        return ","
+
+
+def _detecter_fin_de_ligne(path):
+    """Fin de ligne du fichier (CRLF sous Windows), pour LINES TERMINATED BY"""
+    with open(path, "rb") as f:
+        echantillon = f.read(64 * 1024)
+    if b"\r\n" in echantillon:
+        return "\r\n"
+    if b"\r" in echantillon and b"\n" not in echantillon:
+        return "\r"
+    return "\n"
+
+
+def lire_apercu(path, lignes=5):
+    """Colonnes et premières lignes du fichier, sans le charger en entier"""
+    import pandas as pd
+
+    if str(path).lower().endswith(".xls"):
+        raise ValueError("format .xls non pris en charge, enregistrez le fichier en .xlsx ou .csv")
+    if _est_excel(path):
+        return pd.read_excel(path, nrows=lignes)
+    return pd.read_csv(path, sep=_detecter_separateur(path), nrows=lignes, encoding="utf-8-sig")
+
+
+def proposer_mapping(colonnes_fichier, colonnes_table):
+    """Associer chaque colonne du fichier à la colonne de la table de même nom normalisé"""
+    par_nom = {_normaliser(c): c for c in colonnes_table}
+    return [[colonne, par_nom.get(_normaliser(colonne), "")] for colonne in colonnes_fichier]
+
+
+def _lots(path, batch_size):
+    """Lots de lignes du fichier : lecture par morceaux pour les CSV"""
+    import pandas as pd
+
+    if _est_excel(path):
+        df = pd.read_excel(path)
+        for debut in range(0, len(df), batch_size):
+            yield df.iloc[debut:debut + batch_size]
+    else:
+        yield from pd.read_csv(path, sep=_detecter_separateur(path), chunksize=batch_size,
+                               encoding="utf-8-sig", dtype=str, keep_default_na=False, na_values=[""])
+
+
+def _compter_lignes(path):
+    if _est_excel(path):
+        return None
+    with open(path, "rb") as f:
+        return max(0, sum(1 for _ in f) - 1)
+
+
+def _valeurs_lot(lot, colonnes):
+    """Tuples Python prêts pour le connecteur : NaN -> NULL, Timestamp -> datetime"""
+    import pandas as pd
+
+    valeurs = lot[colonnes].copy()
+    for colonne in valeurs.columns:
+        if pd.api.types.is_datetime64_any_dtype(valeurs[colonne]):
+            valeurs[colonne] = pd.Series(valeurs[colonne].dt.to_pydatetime(), index=valeurs.index, dtype=object)
+    valeurs = valeurs.astype(object)
+    valeurs = valeurs.where(valeurs.notna(), None)
+    return list(valeurs.itertuples(index=False, name=None))
+
+
+def importer_par_lots(host, user, password, db_name, path, table, mapping, batch_size=None, progress=None):
+    """INSERT multi-lignes (executemany), une transaction par lot"""
+    batch_size = batch_size or IMPORT_BATCH_SIZE
+    paires = [(source, cible) for source, cible in mapping if cible]
+    colonnes_source = [source for source, _ in paires]
+    requete = (f"INSERT INTO {_quote(table)} ({', '.join(_quote(c) for _, c in paires)}) "
+               f"VALUES ({', '.join(['%s'] * len(paires))})")
+
+    total = _compter_lignes(path)
+    bilan = {"lignes": 0, "lots": 0, "erreur": None}
+    with connexion(host, user, password, db_name) as conn:
+        cur = conn.cursor()
+        try:
+            for lot in _lots(path, batch_size):
+                # Le connecteur réécrit executemany en un seul INSERT multi-lignes
+                cur.executemany(requete, _valeurs_lot(lot, colonnes_source))
+                conn.commit()
+                bilan["lignes"] += len(lot)
+                bilan["lots"] += 1
+                if progress:
+                    fraction = bilan["lignes"] / total if total else None
+                    progress(fraction, f"{bilan['lignes']} lignes importées")
+        except Exception as e:
+            conn.rollback()
+            bilan["erreur"] = f"lot {bilan['lots'] + 1} annulé : {e}"
+        finally:
+            cur.close()
+    return bilan
+
+
+def importer_load_data(host, user, password, db_name, path, table, mapping, progress=None):
+    """LOAD DATA LOCAL INFILE (CSV uniquement), en une transaction"""
+    if _est_excel(path):
+        return {"lignes": 0, "lots": 0, "erreur": "LOAD DATA ne lit que les fichiers CSV"}
+
+    separateur = _detecter_separateur(path)
+    # Colonnes non associées : lues dans une variable ignorée
+    cibles = [_quote(cible) if cible else "@ignore" for _, cible in mapping]
+    requete = (
+        f"LOAD DATA LOCAL INFILE %s INTO TABLE {_quote(table)} CHARACTER SET utf8mb4 "
+        f"FIELDS TERMINATED BY %s OPTIONALLY ENCLOSED BY '\"' "
+        f"LINES TERMINATED BY %s IGNORE 1 LINES ({', '.join(cibles)})"
+    )
+
+    bilan = {"lignes": 0, "lots": 0, "erreur": None}
+    if progress:
+        progress(None, "Chargement par LOAD DATA…")
+    # Le serveur choisit le fichier qu'il demande : le connecteur ne doit pouvoir lire
+    # que le fichier importé, copié seul dans un répertoire privé
+    dossier = tempfile.mkdtemp(prefix="load_data_")
+    try:
+        copie = os.path.join(dossier, "import.csv")
+        shutil.copyfile(path, copie)
+        import mysql.connector
+        conn = mysql.connector.connect(host=host, user=user, password=password, database=db_name,
+                                       allow_local_infile=False, allow_local_infile_in_path=dossier)
+        try:
+            cur = conn.cursor()
+            cur.execute(requete, (copie, separateur, _detecter_fin_de_ligne(copie)))
+            conn.commit()
+            bilan["lignes"] = cur.rowcount
+            bilan["lots"] = 1
+            cur.close()
+        except Exception as e:
+            conn.rollback()
+            bilan["erreur"] = str(e)
+        finally:
+            conn.close()
+    finally:
+        shutil.rmtree(dossier, ignore_errors=True)
+    return bilan
+
+
+def importer_fichier(host, user, password, db_name, path, table, mapping, batch_size=None,
+                     mode=MODE_INSERT, progress=None):
+    debut = time.perf_counter()
+    if mode == MODE_LOAD_DATA:
+        bilan = importer_load_data(host, user, password, db_name, path, table, mapping, progress)
+    else:
+        bilan = importer_par_lots(host, user, password, db_name, path, table, mapping, batch_size, progress)
+    bilan["secondes"] = time.perf_counter() - debut
+    return bilan
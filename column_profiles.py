@@ -0,0 +1,241 @@
+import os
+import re
+import threading
+import time
+
+from mysql_pool import connexion
+from schema_cache import get_schema_model
+
+# Profil des colonnes (valeurs fréquentes, min/max, volumétrie) ajouté au prompt, calculé en tâche de fond
+PROFILE_ENABLED = os.environ.get("PROFILE_ENABLED", "1") != "0"
+# Intervalle entre deux passes du profileur (secondes)
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", "60"))
+# Tables (re)profilées au plus par passe et par base
+PROFILE_TABLES_PER_PASS = int(os.environ.get("PROFILE_TABLES_PER_PASS", "5"))
+# Âge au-delà duquel une table est reprofilée même sans changement apparent (secondes)
+PROFILE_MAX_AGE = float(os.environ.get("PROFILE_MAX_AGE", "86400"))
+# Coût maximal par table : lignes échantillonnées et durée de chaque requête
+PROFILE_SAMPLE_ROWS = int(os.environ.get("PROFILE_SAMPLE_ROWS", "50000"))
+PROFILE_TIMEOUT_MS = int(os.environ.get("PROFILE_TIMEOUT_MS", "2000"))
+# Une colonne est énumérée si elle a au plus ce nombre de valeurs distinctes
+PROFILE_DISTINCT_LIMIT = int(os.environ.get("PROFILE_DISTINCT_LIMIT", "12"))
+
+PROFILE_HEADER = "VALEURS OBSERVÉES (échantillon, indicatif) :"
+MAX_VALUE_LENGTH = 40
+# Variation de TABLE_ROWS considérée comme un changement de contenu
+ROWS_CHANGE_RATIO = 0.1
+
+TABLES_QUERY = """
+    SELECT TABLE_NAME, TABLE_ROWS, UPDATE_TIME
+    FROM information_schema.TABLES
+    WHERE TABLE_SCHEMA = %s AND TABLE_TYPE = 'BASE TABLE';
+"""
+
+NUMERIC_TYPES = ("tinyint", "smallint", "mediumint", "int", "bigint", "decimal", "float", "double")
+DATE_TYPES = ("date", "datetime", "timestamp", "year")
+
+# Par utilisateur : un compte ne voit jamais les valeurs lues avec les droits d'un autre
+_profiles = {}  # (hôte, utilisateur, base) -> {"tables": {table: profil}}
+_watched = {}   # (hôte, utilisateur, base) -> (mot de passe, serveur de lecture)
+_lock = threading.Lock()
+_wakeup = threading.Event()
+_thread = None
+stats = {"passes": 0, "tables_profiled": 0, "queries": 0, "errors": 0}
+
+
+def _quote(name):
+    return "`" + name.replace("`", "``") + "`"
+
+
+def _base_type(column_type):
+    return column_type.split("(")[0].split()[0].lower()
+
+
+def _enum_values(column_type):
+    """Valeurs déclarées d'un ENUM/SET, sans requête"""
+    return [v.replace("''", "'") for v in re.findall(r"'((?:[^']|'')*)'", column_type)]
+
+
+def _column_roles(table):
+    """Colonnes à énumérer et colonnes à borner (min/max) ; clés primaires et étrangères exclues"""
+    enums, distincts, bornes = {}, [], []
+    for col in table["columns"]:
+        if col["primary_key"] or col["references"] or col["auto_increment"]:
+            continue
+        base = _base_type(col["type"])
+        if base in ("enum", "set"):
+            enums[col["name"]] = _enum_values(col["type"])
+        elif base in ("char", "varchar") or col["type"].lower().startswith("tinyint(1)"):
+            distincts.append(col["name"])
+        elif base in NUMERIC_TYPES or base in DATE_TYPES:
+            bornes.append(col["name"])
+    return enums, distincts, bornes
+
+
+def _hint():
+    return f"/*+ MAX_EXECUTION_TIME({PROFILE_TIMEOUT_MS}) */ " if PROFILE_TIMEOUT_MS else ""
+
+
+def _echantillon(table_name, colonnes):
+    return f"(SELECT {', '.join(_quote(c) for c in colonnes)} FROM {_quote(table_name)} LIMIT {PROFILE_SAMPLE_ROWS}) s"
+
+
+def _short(value):
+    text = str(value)
+    return text if len(text) <= MAX_VALUE_LENGTH else text[:MAX_VALUE_LENGTH - 1] + "…"
+
+
+def profile_table(cur, table_name, table, table_rows):
+    """Profil d'une table, calculé sur au plus PROFILE_SAMPLE_ROWS lignes"""
+    enums, distincts, bornes = _column_roles(table)
+    profil = {"rows": table_rows, "columns": {name: {"values": values} for name, values in enums.items()}}
+    colonnes = distincts + bornes
+    if not colonnes:
+        return profil
+
+    # Une seule requête d'agrégats sur l'échantillon
+    aggregats = ["COUNT(*)"] + [f"COUNT(DISTINCT {_quote(c)})" for c in distincts]
+    for c in bornes:
+        aggregats += [f"MIN({_quote(c)})", f"MAX({_quote(c)})"]
+    cur.execute(f"SELECT {_hint()}{', '.join(aggregats)} FROM {_echantillon(table_name, colonnes)}")
+    row = cur.fetchone()
+    stats["queries"] += 1
+    echantillon, row = row[0], row[1:]
+    if echantillon < PROFILE_SAMPLE_ROWS:
+        # Table lue en entier : le compte est exact
+        profil["rows"] = echantillon
+    cardinalites = dict(zip(distincts, row[:len(distincts)]))
+    for i, c in enumerate(bornes):
+        minimum, maximum = row[len(distincts) + 2 * i], row[len(distincts) + 2 * i + 1]
+        if minimum is not None:
+            profil["columns"][c] = {"min": minimum, "max": maximum}
+
+    for c in distincts:
+        if not 0 < cardinalites[c] <= PROFILE_DISTINCT_LIMIT:
+            continue
+        cur.execute(f"SELECT {_hint()}{_quote(c)} FROM {_echantillon(table_name, [c])} "
+                    f"WHERE {_quote(c)} IS NOT NULL GROUP BY {_quote(c)} ORDER BY COUNT(*) DESC")
+        stats["queries"] += 1
+        profil["columns"][c] = {"values": [v for (v,) in cur.fetchall()]}
+    return profil
+
+
+def _a_rafraichir(ancien, signature, now):
+    if ancien is None:
+        return True
+    if now - ancien["profiled_at"] > PROFILE_MAX_AGE:
+        return True
+    update_time, table_rows = signature
+    ancien_update, anciennes_lignes = ancien["signature"]
+    if update_time and update_time != ancien_update:
+        return True
+    return abs((table_rows or 0) - (anciennes_lignes or 0)) > ROWS_CHANGE_RATIO * max(anciennes_lignes or 0, 1)
+
+
+def refresh_profile(host, user, password, db_name, read_from=None, max_tables=None):
+    """Passe incrémentale : profiler les tables nouvelles, modifiées ou trop anciennes.
+
+    Au plus `max_tables` tables par passe, les plus anciennement profilées
+    d'abord. `read_from` (hôte, utilisateur, mot de passe) désigne le serveur
+    interrogé, une réplique par exemple. Retourne le nombre de tables profilées.
+    """
+    max_tables = PROFILE_TABLES_PER_PASS if max_tables is None else max_tables
+    model = get_schema_model(host, user, password, db_name)
+    r_host, r_user, r_password = read_from or (host, user, password)
+    key = (host, user, db_name)
+    with _lock:
+        tables = dict(_profiles.get(key, {}).get("tables", {}))
+
+    with connexion(r_host, r_user, r_password, db_name) as conn:
+        cur = conn.cursor()
+        cur.execute(TABLES_QUERY, (db_name,))
+        signatures = {name: (str(update_time) if update_time else None, rows)
+                      for name, rows, update_time in cur.fetchall()}
+        now = time.time()
+        a_faire = [name for name in model["tables"]
+                   if name in signatures and _a_rafraichir(tables.get(name), signatures[name], now)]
+        a_faire.sort(key=lambda name: tables[name]["profiled_at"] if name in tables else 0)
+
+        for name in a_faire[:max_tables]:
+            try:
+                profil = profile_table(cur, name, model["tables"][name], signatures[name][1])
+            except Exception:
+                # Délai dépassé ou type non agrégeable : la table garde son ancien profil
+                stats["errors"] += 1
+                continue
+            profil["signature"] = signatures[name]
+            profil["profiled_at"] = now
+            tables[name] = profil
+            stats["tables_profiled"] += 1
+        cur.close()
+
+    # Tables supprimées depuis la dernière passe
+    tables = {name: profil for name, profil in tables.items() if name in model["tables"]}
+    with _lock:
+        _profiles[key] = {"tables": tables}
+    return min(len(a_faire), max_tables)
+
+
+def get_profile(host, user, db_name):
+    """Profil en cache (éventuellement partiel), sans accès à la base"""
+    with _lock:
+        return _profiles.get((host, user, db_name))
+
+
+def render_profile(profile, tables=None):
+    """Section du prompt : volumétrie, valeurs fréquentes et bornes, pour les tables demandées"""
+    if not profile:
+        return ""
+    lignes = []
+    for name, profil in profile["tables"].items():
+        if tables is not None and name not in tables:
+            continue
+        parties = []
+        for col, info in profil["columns"].items():
+            if "values" in info:
+                parties.append(f"{col} ∈ {{{', '.join(repr(_short(v)) for v in info['values'])}}}")
+            else:
+                parties.append(f"{col} {_short(info['min'])} … {_short(info['max'])}")
+        entete = f"{name} (~{profil['rows']} lignes)" if profil["rows"] is not None else name
+        lignes.append(f"{entete}: {'; '.join(parties)}" if parties else entete)
+    if not lignes:
+        return ""
+    return PROFILE_HEADER + "\n" + "\n".join(lignes)
+
+
+def strip_profile(text):
+    """Retirer la section de profil d'un prompt système (elle ne contient pas de ligne vide)"""
+    return re.sub(r"\n\n" + re.escape(PROFILE_HEADER) + r"\n.*?(?=\n\n|\Z)", "", text, flags=re.S)
+
+
+def _boucle():
+    while True:
+        with _lock:
+            bases = list(_watched.items())
+        for (host, user, db_name), (password, read_from) in bases:
+            try:
+                refresh_profile(host, user, password, db_name, read_from)
+            except Exception:
+                stats["errors"] += 1
+        stats["passes"] += 1
+        _wakeup.wait(PROFILE_INTERVAL)
+        _wakeup.clear()
+
+
+def watch(host, user, password, db_name, read_from=None):
+    """Inscrire une base auprès du profileur de fond ; la première passe démarre aussitôt"""
+    global _thread
+    if not PROFILE_ENABLED or not (host and db_name):
+        return
+    with _lock:
+        _watched[(host, user, db_name)] = (password, read_from)
+        if _thread is None:
+            _thread = threading.Thread(target=_boucle, name="column-profiler", daemon=True)
+            _thread.start()
+    _wakeup.set()
+
+
+def snapshot():
+    with _lock:
+        return {**stats, "databases": len(_watched),
+                "tables": sum(len(p["tables"]) for p in _profiles.values())}
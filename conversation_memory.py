@@ -0,0 +1,108 @@
+import os
+import re
+
+from groq_functions import estimate_tokens, extract_sql_query
+
+# Budget (en tokens) de l'historique envoyé au modèle, prompt système compris
+CONVERSATION_TOKEN_BUDGET = int(os.environ.get("CONVERSATION_TOKEN_BUDGET", "6000"))
+# Nombre minimal d'échanges récents gardés tels quels
+CONVERSATION_KEEP_TURNS = int(os.environ.get("CONVERSATION_KEEP_TURNS", "2"))
+SUMMARY_MAX_LINES = 20
+
+SUMMARY_PREFIX = "Résumé des échanges précédents :"
+MESSAGE_OVERHEAD = 4  # tokens de structure par message (rôle, séparateurs)
+
+RESULT_TABLE_RE = re.compile(r"### 📊 Résultats de la requête\n\n((?:\|.*\|\n?)+)(.*?)(\*\*📈 Total: (\d+) ligne\(s\)\*\*|$)", re.DOTALL)
+
+
+def message_tokens(message):
+    return estimate_tokens(message["content"]) + MESSAGE_OVERHEAD
+
+
+def conversation_tokens(messages):
+    return sum(message_tokens(m) for m in messages)
+
+
+def result_stub(resultat):
+    """Trace compacte d'un résultat pour l'historique : colonnes et nombre de lignes"""
+    if resultat["error"]:
+        return f"[Erreur SQL : {resultat['error'][:200]}]"
+    if not resultat["columns"]:
+        return f"[Requête exécutée : {resultat['rowcount']} lignes affectées]"
+    total = resultat["total"] if resultat["total"] is not None else f"plus de {len(resultat['rows'])}"
+    return f"[Résultat : {total} ligne(s) ; colonnes : {', '.join(resultat['columns'])}]"
+
+
+def _table_to_stub(match):
+    header = match.group(1).split("\n", 1)[0]
+    columns = [c.strip() for c in header.strip().strip("|").split("|")]
+    total = match.group(4) or "?"
+    return f"[Résultat : {total} ligne(s) ; colonnes : {', '.join(columns)}]"
+
+
+def compact_result_tables(content):
+    """Remplacer les tableaux de résultats markdown par un résumé d'une ligne"""
+    return RESULT_TABLE_RE.sub(_table_to_stub, content)
+
+
+def _summary_line(user_message, assistant_message):
+    question = " ".join(user_message["content"].split())[:100]
+    line = f"- Q : {question}"
+    if assistant_message:
+        sql = extract_sql_query(assistant_message["content"])
+        if sql:
+            line += f" → SQL : {' '.join(sql.split())[:200]}"
+    return line
+
+
+def compact_conversation(messages, budget=None, head_tokens=None):
+    """Retourner une conversation tenant dans le budget.
+
+    Le prompt système est toujours gardé ; les tableaux de résultats deviennent
+    des résumés, puis les échanges les plus anciens sont condensés dans un
+    message de résumé jusqu'à respecter le budget. `head_tokens` est la taille
+    comptée pour le prompt système : celle du prompt réellement envoyé (schéma
+    réduit) quand on compacte la conversation mémorisée, qui garde le schéma complet.
+    """
+    budget = budget or CONVERSATION_TOKEN_BUDGET
+    if not messages:
+        return messages
+
+    head = [messages[0]] if messages[0]["role"] == "system" else []
+    rest = messages[len(head):]
+    ecart = head_tokens - conversation_tokens(head) if head and head_tokens is not None else 0
+
+    def taille(result):
+        return conversation_tokens(result) + ecart
+
+    summary_lines = []
+    if rest and rest[0]["role"] == "system" and rest[0]["content"].startswith(SUMMARY_PREFIX):
+        summary_lines = rest[0]["content"].split("\n")[1:]
+        rest = rest[1:]
+
+    rest = [
+        {**m, "content": compact_result_tables(m["content"])} if m["role"] == "assistant" else m
+        for m in rest
+    ]
+
+    def build():
+        summary = []
+        if summary_lines:
+            lines = summary_lines[-SUMMARY_MAX_LINES:]
+            summary = [{"role": "system", "content": "\n".join([SUMMARY_PREFIX] + lines)}]
+        return head + summary + rest
+
+    result = build()
+    # Condenser les échanges les plus anciens (question + réponse) tant qu'on dépasse
+    while taille(result) > budget and len(rest) > CONVERSATION_KEEP_TURNS * 2:
+        user_message = rest.pop(0)
+        assistant_message = rest.pop(0) if rest and rest[0]["role"] == "assistant" else None
+        summary_lines.append(_summary_line(user_message, assistant_message))
+        result = build()
+
+    # Le résumé lui-même cède ses lignes les plus anciennes en dernier recours
+    while taille(result) > budget and summary_lines:
+        summary_lines.pop(0)
+        result = build()
+
+    return result
@@ -1,11 +1,40 @@
-import requests
+import asyncio
+import contextlib
+import httpx
 import json
-import re
+import os
+import threading
+from async_pipeline import STAGES
+from groq_scheduler import PRIORITY_INTERACTIVE, RETRY_STATUSES, execute, execute_async, scheduler
+from metrics import incr
+from sql_classifier import UNKNOWN, classify_script, first_keyword
 
-def call_groq(messages, api_key, model="llama-3.1-8b-instant", temperature=0.7):
-    if not api_key:
-        return "Veuillez fournir une clé API Groq.", messages
+# Point d'accès compatible OpenAI (surchargeable pour un serveur local de test)
+GROQ_API_URL = os.environ.get("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
+GROQ_CONNECT_TIMEOUT = float(os.environ.get("GROQ_CONNECT_TIMEOUT", "5"))
+GROQ_READ_TIMEOUT = float(os.environ.get("GROQ_READ_TIMEOUT", "60"))
+GROQ_HTTP_POOL_SIZE = int(os.environ.get("GROQ_HTTP_POOL_SIZE", "20"))
+MAX_COMPLETION_TOKENS = 1000
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def get_http_session():
+    """Session HTTP keep-alive partagée : une seule poignée de main TLS par connexion"""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            # Importé au premier appel synchrone : le chat passe par httpx
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=GROQ_HTTP_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http_session = session
+        return _http_session
 
+def _groq_payload(messages, api_key, model, temperature, stream=False):
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json"
@@ -15,25 +44,169 @@ def call_groq(messages, api_key, model="llama-3.1-8b-instant", temperature=0.7):
         "model": model,
         "messages": messages,
         "temperature": temperature,
-        "max_tokens": 1000
+        "max_tokens": MAX_COMPLETION_TOKENS
     }
+    if stream:
+        data["stream"] = True
+    return headers, json.dumps(data)
+
+def _groq_request(messages, api_key, model, temperature):
+    headers, body = _groq_payload(messages, api_key, model, temperature)
+    return get_http_session().post(
+        GROQ_API_URL,
+        headers=headers,
+        data=body,
+        timeout=(GROQ_CONNECT_TIMEOUT, GROQ_READ_TIMEOUT)
+    )
+
+_async_client = None
+_async_client_loop = None
+
+def get_async_client():
+    """Client HTTP asynchrone partagé, lié à la boucle d'événements qui l'utilise"""
+    global _async_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client_loop is not loop:
+        _async_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(GROQ_READ_TIMEOUT, connect=GROQ_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=GROQ_HTTP_POOL_SIZE, max_keepalive_connections=GROQ_HTTP_POOL_SIZE)
+        )
+        _async_client_loop = loop
+    return _async_client
+
+def _request_tokens(messages):
+    """Tokens réservés pour une requête : prompt estimé + réponse maximale"""
+    return sum(estimate_tokens(m["content"]) + 4 for m in messages) + MAX_COMPLETION_TOKENS
+
+def _used_tokens(response_json):
+    usage = response_json.get("usage") or {}
+    return usage.get("total_tokens")
+
+def _compter_appel(lease, status, messages, response_json=None, completion=""):
+    """Compteurs Prometheus : appels par modèle et statut, tokens du prompt et de la réponse"""
+    incr("llm_requests_total", model=lease["model"], status=status)
+    if status != 200:
+        return
+    usage = (response_json or {}).get("usage") or {}
+    incr("llm_prompt_tokens_total", usage.get("prompt_tokens") or _request_tokens(messages) - MAX_COMPLETION_TOKENS, model=lease["model"])
+    incr("llm_completion_tokens_total", usage.get("completion_tokens") or estimate_tokens(completion), model=lease["model"])
+
+def call_groq(messages, api_key, model="llama-3.1-8b-instant", temperature=0.7, priority=PRIORITY_INTERACTIVE):
+    if not api_key:
+        return "Veuillez fournir une clé API Groq.", messages
 
     try:
-        response = requests.post(
-            "https://api.groq.com/openai/v1/chat/completions",
-            headers=headers,
-            data=json.dumps(data)
+        response, lease = execute(
+            lambda key, used_model: _groq_request(messages, key, used_model, temperature),
+            api_key, model, _request_tokens(messages), groq_models, priority
         )
 
         if response.status_code == 200:
-            assistant_message = response.json()["choices"][0]["message"]["content"]
+            data = response.json()
+            scheduler.settle(lease, _used_tokens(data), response.headers)
+            assistant_message = data["choices"][0]["message"]["content"]
+            _compter_appel(lease, 200, messages, data, assistant_message)
+            messages.append({"role": "assistant", "content": assistant_message})
+            return assistant_message, messages
+        else:
+            _compter_appel(lease, response.status_code, messages)
+            return f"Erreur : {response.status_code} - {response.text}", messages
+    except Exception as e:
+        return f"Erreur : {str(e)}", messages
+
+async def call_groq_async(messages, api_key, model="llama-3.1-8b-instant", temperature=0.7, priority=PRIORITY_INTERACTIVE,
+                          trace=None):
+    """Version asynchrone de call_groq, limitée par l'étape "llm" du pipeline.
+
+    Si fourni, `trace["model"]` reçoit le modèle réellement servi (repli du planificateur compris).
+    """
+    if not api_key:
+        return "Veuillez fournir une clé API Groq.", messages
+
+    async def send(key, used_model):
+        headers, body = _groq_payload(messages, key, used_model, temperature)
+        async with STAGES["llm"].slot():
+            return await get_async_client().post(GROQ_API_URL, headers=headers, content=body)
+
+    try:
+        response, lease = await execute_async(send, api_key, model, _request_tokens(messages), groq_models, priority)
+        if trace is not None:
+            trace["model"] = lease["model"]
+
+        if response.status_code == 200:
+            data = response.json()
+            scheduler.settle(lease, _used_tokens(data), response.headers)
+            assistant_message = data["choices"][0]["message"]["content"]
+            _compter_appel(lease, 200, messages, data, assistant_message)
             messages.append({"role": "assistant", "content": assistant_message})
             return assistant_message, messages
         else:
+            _compter_appel(lease, response.status_code, messages)
             return f"Erreur : {response.status_code} - {response.text}", messages
     except Exception as e:
         return f"Erreur : {str(e)}", messages
 
+async def call_groq_stream_async(messages, api_key, model="llama-3.1-8b-instant", temperature=0.7, priority=PRIORITY_INTERACTIVE):
+    """Version SSE asynchrone de call_groq : produit le texte cumulé au fil des tokens.
+
+    Le message complet est ajouté à `messages` à la fin du flux ; en cas
+    d'erreur, le dernier texte produit commence par "Erreur". La place dans
+    l'étape "llm" est prise à l'envoi et gardée pendant tout le flux, mais
+    pas pendant l'attente d'un créneau ni l'attente avant un nouvel essai.
+    """
+    if not api_key:
+        yield "Veuillez fournir une clé API Groq."
+        return
+
+    place = contextlib.AsyncExitStack()
+
+    async def send(key, used_model):
+        headers, body = _groq_payload(messages, key, used_model, temperature, stream=True)
+        client = get_async_client()
+        await place.enter_async_context(STAGES["llm"].slot())
+        response = await client.send(client.build_request("POST", GROQ_API_URL, headers=headers, content=body), stream=True)
+        if response.status_code in RETRY_STATUSES:
+            # Nouvel essai après un délai : la place est rendue entre-temps
+            await place.aclose()
+        return response
+
+    try:
+        prompt_tokens = _request_tokens(messages) - MAX_COMPLETION_TOKENS
+        response, lease = await execute_async(send, api_key, model, _request_tokens(messages), groq_models, priority)
+        try:
+            if response.status_code != 200:
+                _compter_appel(lease, response.status_code, messages)
+                erreur = (await response.aread()).decode("utf-8", errors="replace")
+                yield f"Erreur : {response.status_code} - {erreur}"
+                return
+
+            assistant_message = ""
+            async for line in response.aiter_lines():
+                if not line or not line.startswith("data:"):
+                    continue
+                payload = line[len("data:"):].strip()
+                if payload == "[DONE]":
+                    break
+                delta = json.loads(payload)["choices"][0].get("delta", {})
+                if delta.get("content"):
+                    assistant_message += delta["content"]
+                    yield assistant_message
+            scheduler.settle(lease, prompt_tokens + estimate_tokens(assistant_message), response.headers)
+            _compter_appel(lease, 200, messages, completion=assistant_message)
+        finally:
+            await response.aclose()
+
+        messages.append({"role": "assistant", "content": assistant_message})
+        yield assistant_message
+    except Exception as e:
+        yield f"Erreur : {str(e)}"
+    finally:
+        await place.aclose()
+
+def estimate_tokens(text):
+    """Estimation rapide du nombre de tokens (~4 caractères par token)"""
+    return (len(text) + 3) // 4
+
 groq_models = [
     "llama-3.1-8b-instant",
     "llama-3.3-70b-versatile",
@@ -43,78 +216,79 @@ groq_models = [
     "mistral-saba-24b"
 ]
 
+def _code_blocks(text):
+    """Blocs de code ``` de la réponse : (langage, contenu)"""
+    parts = text.split("```")
+    for bloc in parts[1:len(parts) - 1 + len(parts) % 2:2]:
+        first_line, _, rest = bloc.partition("\n")
+        if first_line.strip() and " " not in first_line.strip() and rest:
+            yield first_line.strip().lower(), rest
+        else:
+            yield "", bloc
+
+def extract_sql_block(text):
+    """Instructions du premier bloc de code SQL refermé, sans repli sur les lignes du texte.
+
+    Un bloc encore ouvert est ignoré : sûr pendant le streaming, où le bloc
+    retenu ici est aussi celui que retiendra `extract_sql_query` à la fin.
+    """
+    for langue, bloc in _code_blocks(text):
+        script = classify_script(bloc)
+        # Un bloc ```sql est pris tel quel ; un bloc sans langage doit contenir du SQL reconnu
+        if script and (langue in ("sql", "mysql") or any(kind != UNKNOWN for _, kind in script)):
+            return ";\n".join(statement for statement, _ in script)
+    return None
+
 def extract_sql_query(text):
-    """Extraire la requête SQL du texte de réponse"""
-    sql_patterns = [
-        r'```sql\s*\n(.*?)\n```',
-        r'```\s*\n(SELECT.*?)\n```',
-        r'```\s*\n(INSERT.*?)\n```',
-        r'```\s*\n(UPDATE.*?)\n```',
-        r'```\s*\n(DELETE.*?)\n```',
-    ]
-    
-    for pattern in sql_patterns:
-        match = re.search(pattern, text, re.DOTALL | re.IGNORECASE)
-        if match:
-            query = match.group(1).strip()
-            # Vérifier que ce n'est pas une requête de structure
-            if not re.match(r'^(CREATE|ALTER|DROP)\s+', query, re.IGNORECASE):
-                return query
+    """Extraire les instructions SQL du texte de réponse (premier bloc de code SQL)"""
+    sql = extract_sql_block(text)
+    if sql:
+        return sql
     
-    # Chercher des requêtes sûres uniquement
-    lines = text.split('\n')
-    for line in lines:
-        line = line.strip()
-        if re.match(r'^(SELECT|INSERT|UPDATE|DELETE)\s+', line, re.IGNORECASE):
+    # Sans bloc de code : première ligne qui commence par une instruction SQL
+    for line in text.split('\n'):
+        if first_keyword(line) in ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE"):
             return line.strip()
     
     return None
 
-def format_sql_result(result, query):
-    """Formater les résultats SQL pour un affichage plus joli"""
-    if not result or "Erreur" in result:
-        return result
-    
-    # Si c'est un message de succès (INSERT, UPDATE, DELETE)
-    if "Requête exécutée avec succès" in result:
-        return f"✅ **{result}**"
-    
-    try:
-        lines = result.strip().split('\n')
-        if len(lines) < 2:
-            return result
-        
-        # Séparer les colonnes et les données
-        headers = lines[0].split(', ')
-        rows = [line.split(', ') for line in lines[1:]]
-        
-        # Créer un tableau markdown
-        markdown_table = "### 📊 Résultats de la requête\n\n"
-        
-        # En-têtes
-        markdown_table += "| " + " | ".join(headers) + " |\n"
+def _cellule(value):
+    """Rendre une valeur sûre pour une cellule de tableau markdown"""
+    if value is None:
+        return "NULL"
+    return str(value).replace("|", "\\|").replace("\n", " ")
+
+def format_resultat(resultat, avec_tableau=True):
+    """Formater un résultat structuré (voir executer_requete_resultat)"""
+    if resultat["error"]:
+        return f"Erreur : {resultat['error']}"
+
+    if not resultat["columns"]:
+        return f"✅ **Requête exécutée avec succès ({resultat['rowcount']} lignes affectées)**"
+
+    headers = resultat["columns"]
+    rows = resultat["rows"]
+
+    markdown_table = "### 📊 Résultats de la requête\n\n"
+    if avec_tableau:
+        markdown_table += "| " + " | ".join(_cellule(h) for h in headers) + " |\n"
         markdown_table += "|" + "---|" * len(headers) + "\n"
-        
-        # Données (limiter à 50 lignes pour l'affichage)
-        max_rows = min(50, len(rows))
-        for i, row in enumerate(rows[:max_rows]):
-            # S'assurer que chaque ligne a le bon nombre de colonnes
-            while len(row) < len(headers):
-                row.append("")
-            markdown_table += "| " + " | ".join(str(cell) for cell in row[:len(headers)]) + " |\n"
-        
-        # Ajouter info si tronqué
-        if len(rows) > max_rows:
-            markdown_table += f"\n*... et {len(rows) - max_rows} autres lignes*"
-        
-        markdown_table += f"\n\n**📈 Total: {len(rows)} ligne(s)**"
-        
-        return markdown_table
-        
-    except Exception as e:
-        return f"Résultat:\n```\n{result}\n```"
+        for row in rows:
+            markdown_table += "| " + " | ".join(_cellule(cell) for cell in row) + " |\n"
+
+    total = resultat["total"]
+    if resultat["has_more"]:
+        if total is not None:
+            markdown_table += f"\n*... et {total - len(rows)} autres lignes*"
+        else:
+            markdown_table += f"\n*... et d'autres lignes (plus de {len(rows)})*"
+
+    if total is not None:
+        markdown_table += f"\n\n**📈 Total: {total} ligne(s)**"
+
+    return markdown_table
 
-def clear_conversation(schema_text="", custom_role="", custom_rules=""):
+def clear_conversation(schema_text="", custom_role="", custom_rules="", profile_text=""):
     # Rôle par défaut
     default_role = "Tu es un assistant expert en base de données MySQL."
     
@@ -132,6 +306,9 @@ def clear_conversation(schema_text="", custom_role="", custom_rules=""):
     # Utiliser les valeurs personnalisées si fournies, sinon les valeurs par défaut
     role = custom_role.strip() if custom_role.strip() else default_role
     rules = custom_rules.strip() if custom_rules.strip() else default_rules
+    # Profil des colonnes (valeurs fréquentes, bornes) placé juste après le schéma
+    if profile_text:
+        schema_text = f"{schema_text}\n\n{profile_text}"
     
     return [{
         "role": "system",
@@ -0,0 +1,280 @@
+import asyncio
+import itertools
+import os
+import random
+import re
+import threading
+import time
+
+# Limites de débit appliquées côté client, par clé API et par modèle
+GROQ_RPM = int(os.environ.get("GROQ_RPM", "30"))
+GROQ_TPM = int(os.environ.get("GROQ_TPM", "6000"))
+# Limites propres à certains modèles : "modele=rpm:tpm,autre_modele=rpm:tpm"
+GROQ_MODEL_LIMITS = os.environ.get("GROQ_MODEL_LIMITS", "")
+GROQ_MAX_RETRIES = int(os.environ.get("GROQ_MAX_RETRIES", "3"))
+# Attente maximale d'un créneau avant d'abandonner (secondes)
+GROQ_MAX_WAIT = float(os.environ.get("GROQ_MAX_WAIT", "30"))
+# Au-delà de cette attente sur le modèle demandé, le modèle de repli est essayé
+GROQ_FALLBACK_AFTER = float(os.environ.get("GROQ_FALLBACK_AFTER", "5"))
+GROQ_FALLBACK_MODEL = os.environ.get("GROQ_FALLBACK_MODEL", "")
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+RETRY_STATUSES = (429, 503)
+POLL_INTERVAL = 0.25
+
+
+class RateLimitError(Exception):
+    """Aucun créneau disponible dans le délai GROQ_MAX_WAIT"""
+
+
+def _parse_limits(text):
+    limits = {}
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        model, _, values = item.partition("=")
+        rpm, _, tpm = values.partition(":")
+        limits[model.strip()] = (int(rpm or GROQ_RPM), int(tpm or GROQ_TPM))
+    return limits
+
+
+MODEL_LIMITS = _parse_limits(GROQ_MODEL_LIMITS)
+
+
+def split_keys(api_key):
+    """Plusieurs clés API séparées par des virgules ou des retours à la ligne"""
+    return [key for key in re.split(r"[\s,;]+", api_key or "") if key]
+
+
+def _parse_duration(text):
+    """Durée au format des en-têtes Groq ("7.66s", "2m59.56s", "250ms") ou nombre de secondes"""
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        pass
+    total = 0.0
+    for value, unit in re.findall(r"([\d.]+)(ms|h|m|s)", text or ""):
+        total += float(value) * {"ms": 0.001, "h": 3600, "m": 60, "s": 1}[unit]
+    return total or None
+
+
+def retry_delay(headers, attempt):
+    """Délai avant nouvel essai : retry-after, puis en-têtes de remise à zéro, sinon backoff exponentiel"""
+    for name in ("retry-after", "x-ratelimit-reset-tokens", "x-ratelimit-reset-requests"):
+        delay = _parse_duration(headers.get(name))
+        if delay:
+            return delay
+    return min(30.0, 2 ** attempt) * (0.5 + random.random())
+
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount):
+        self.level -= amount
+
+
+class _Limiter:
+    """Seaux requêtes/minute et tokens/minute d'un couple (clé, modèle)"""
+
+    def __init__(self, rpm, tpm):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.blocked_until = 0.0
+
+    def wait_time(self, tokens, now):
+        return max(self.blocked_until - now, self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+
+
+class Scheduler:
+    """File de priorité partagée par toutes les sessions devant les limites de l'API"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._limiters = {}
+        self._waiting = {}  # ticket -> ((priorité, ordre d'arrivée), modèle, clés)
+        self._seq = itertools.count()
+        self._round_robin = {}
+        self.stats = {"requests": 0, "throttled": 0, "retries": 0, "fallbacks": 0, "rejected": 0}
+
+    def _limiter(self, key, model):
+        limiter = self._limiters.get((key, model))
+        if limiter is None:
+            limiter = _Limiter(*MODEL_LIMITS.get(model, (GROQ_RPM, GROQ_TPM)))
+            self._limiters[(key, model)] = limiter
+        return limiter
+
+    def enter(self, priority, model, keys):
+        ticket = next(self._seq)
+        with self._lock:
+            self._waiting[ticket] = ((priority, ticket), model, frozenset(keys))
+        return ticket
+
+    def leave(self, ticket):
+        with self._lock:
+            self._waiting.pop(ticket, None)
+
+    def _first_in_line(self, ticket, key, model):
+        """Premier de la file parmi les demandes qui se disputent le seau (clé, modèle)"""
+        rangs = [rang for rang, m, keys in self._waiting.values() if m == model and key in keys]
+        if ticket is None:
+            return not rangs
+        return min(rangs) == self._waiting[ticket][0]
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def try_reserve(self, ticket, keys, model, tokens):
+        """(clé, 0) si un créneau est réservé, sinon (None, attente estimée).
+
+        Pour chaque clé, seul le premier de la file (par priorité puis arrivée)
+        parmi les demandes qui peuvent l'utiliser réserve : une clé épuisée ne
+        retient pas les demandes servies par d'autres clés. Les clés sont
+        essayées à tour de rôle.
+        """
+        with self._lock:
+            now = time.monotonic()
+            debut = self._round_robin.get(tuple(keys), 0)
+            attente = None
+            for i in range(len(keys)):
+                index = (debut + i) % len(keys)
+                limiter = self._limiter(keys[index], model)
+                wait = limiter.wait_time(tokens, now)
+                if not self._first_in_line(ticket, keys[index], model):
+                    # Derrière une autre demande : au moins l'attente du seau, pour déclencher le repli
+                    wait = max(wait, POLL_INTERVAL)
+                elif wait <= 0:
+                    limiter.requests.take(1)
+                    limiter.tokens.take(tokens)
+                    self._round_robin[tuple(keys)] = index + 1
+                    self._waiting.pop(ticket, None)
+                    self.stats["requests"] += 1
+                    return keys[index], 0.0
+                attente = wait if attente is None else min(attente, wait)
+            return None, attente
+
+    def block(self, key, model, seconds):
+        """Suspendre (clé, modèle) après un 429 : toutes les sessions en tiennent compte"""
+        with self._lock:
+            limiter = self._limiter(key, model)
+            limiter.blocked_until = max(limiter.blocked_until, time.monotonic() + seconds)
+            self.stats["retries"] += 1
+
+    def settle(self, lease, used_tokens=None, headers=None):
+        """Corriger la réservation avec la consommation réelle et les compteurs renvoyés par l'API"""
+        with self._lock:
+            limiter = self._limiter(lease["key"], lease["model"])
+            if used_tokens is not None:
+                limiter.tokens.take(used_tokens - lease["tokens"])
+            restant = _parse_duration((headers or {}).get("x-ratelimit-remaining-tokens"))
+            if restant is not None:
+                limiter.tokens.level = min(limiter.tokens.level, restant)
+
+    def snapshot(self):
+        with self._lock:
+            return {**self.stats, "waiting": len(self._waiting)}
+
+
+scheduler = Scheduler()
+
+
+def fallback_model(model, models):
+    if GROQ_FALLBACK_MODEL and GROQ_FALLBACK_MODEL != model:
+        return GROQ_FALLBACK_MODEL
+    return next((m for m in models if m != model), None)
+
+
+def _acquire_steps(keys, model, tokens, priority, fallback):
+    """Boucle d'attente commune aux versions synchrone et asynchrone.
+
+    Produit des délais d'attente ; se termine en retournant (clé, modèle).
+    """
+    deadline = time.monotonic() + GROQ_MAX_WAIT
+    ticket = scheduler.enter(priority, model, keys)
+    premier_refus = True
+    try:
+        while True:
+            key, wait = scheduler.try_reserve(ticket, keys, model, tokens)
+            if key:
+                return key, model
+            if premier_refus:
+                scheduler.count("throttled")
+                premier_refus = False
+            if fallback and wait > GROQ_FALLBACK_AFTER:
+                key, _ = scheduler.try_reserve(None, keys, fallback, tokens)
+                if key:
+                    scheduler.count("fallbacks")
+                    return key, fallback
+            if time.monotonic() + min(wait, POLL_INTERVAL) > deadline:
+                scheduler.count("rejected")
+                raise RateLimitError(f"limite de débit Groq atteinte pour {model}, réessayez dans quelques secondes")
+            yield min(wait, POLL_INTERVAL)
+    finally:
+        scheduler.leave(ticket)
+
+
+def _acquire(keys, model, tokens, priority, fallback):
+    steps = _acquire_steps(keys, model, tokens, priority, fallback)
+    try:
+        while True:
+            time.sleep(next(steps))
+    except StopIteration as fin:
+        return fin.value
+
+
+async def _acquire_async(keys, model, tokens, priority, fallback):
+    steps = _acquire_steps(keys, model, tokens, priority, fallback)
+    try:
+        while True:
+            await asyncio.sleep(next(steps))
+    except StopIteration as fin:
+        return fin.value
+
+
+def execute(send, api_key, model, tokens, models=(), priority=PRIORITY_INTERACTIVE):
+    """Envoyer une requête dans le respect des limites, avec nouvel essai sur 429/503.
+
+    `send(clé, modèle)` effectue l'appel HTTP. Retourne (réponse, bail) ; le
+    bail (clé, modèle, tokens réservés) sert ensuite à `scheduler.settle`.
+    """
+    keys = split_keys(api_key)
+    if not keys:
+        raise ValueError("aucune clé API Groq fournie")
+    fallback = fallback_model(model, models)
+    for attempt in range(GROQ_MAX_RETRIES + 1):
+        key, used_model = _acquire(keys, model, tokens, priority, fallback)
+        response = send(key, used_model)
+        lease = {"key": key, "model": used_model, "tokens": tokens}
+        if response.status_code not in RETRY_STATUSES or attempt == GROQ_MAX_RETRIES:
+            return response, lease
+        scheduler.block(key, used_model, retry_delay(response.headers, attempt))
+        response.close()
+
+
+async def execute_async(send, api_key, model, tokens, models=(), priority=PRIORITY_INTERACTIVE):
+    """Version asynchrone de `execute` ; `send` est une coroutine"""
+    keys = split_keys(api_key)
+    if not keys:
+        raise ValueError("aucune clé API Groq fournie")
+    fallback = fallback_model(model, models)
+    for attempt in range(GROQ_MAX_RETRIES + 1):
+        key, used_model = await _acquire_async(keys, model, tokens, priority, fallback)
+        response = await send(key, used_model)
+        lease = {"key": key, "model": used_model, "tokens": tokens}
+        if response.status_code not in RETRY_STATUSES or attempt == GROQ_MAX_RETRIES:
+            return response, lease
+        scheduler.block(key, used_model, retry_delay(response.headers, attempt))
+        await response.aclose()
@@ -0,0 +1,59 @@
+import asyncio
+import os
+
+from groq_functions import call_groq_async
+
+# Mode couverture : le modèle rapide part seul, le modèle fort le rejoint après HEDGE_DELAY secondes
+HEDGE_FAST_MODEL = os.environ.get("HEDGE_FAST_MODEL", "llama-3.1-8b-instant")
+HEDGE_STRONG_MODEL = os.environ.get("HEDGE_STRONG_MODEL", "llama-3.3-70b-versatile")
+# 0 : les deux modèles sont interrogés en parallèle
+HEDGE_DELAY = float(os.environ.get("HEDGE_DELAY", "1.5"))
+
+
+async def _tentative(messages, api_key, model, temperature, valider):
+    """(modèle demandé, modèle servi, réponse, historique, validité) ; le planificateur a pu basculer sur son repli"""
+    trace = {}
+    reponse, historique = await call_groq_async(list(messages), api_key, model, temperature, trace=trace)
+    valide = False
+    if historique and historique[-1]["role"] == "assistant":
+        try:
+            valide = await valider(reponse)
+        except Exception:
+            valide = False
+    return model, trace.get("model", model), reponse, historique, valide
+
+
+async def generer_couverte(messages, api_key, temperature, valider, fast=None, strong=None, delay=None):
+    """Interroger un modèle rapide puis un modèle fort ; la première réponse valide l'emporte.
+
+    Le modèle fort est lancé après `delay` secondes, ou dès que la réponse
+    rapide est jugée invalide par `valider(réponse)` (coroutine). L'appel
+    perdant est annulé. Sans réponse valide, celle du modèle fort est
+    retenue. Retourne (réponse, messages, modèle retenu).
+    """
+    fast = fast or HEDGE_FAST_MODEL
+    strong = strong or HEDGE_STRONG_MODEL
+    delay = HEDGE_DELAY if delay is None else delay
+
+    taches = {asyncio.ensure_future(_tentative(messages, api_key, fast, temperature, valider))}
+    fort_lance = False
+    repli = None
+    try:
+        while True:
+            done, taches = await asyncio.wait(taches, timeout=None if fort_lance else delay,
+                                              return_when=asyncio.FIRST_COMPLETED)
+            for tache in done:
+                model, servi, reponse, historique, valide = tache.result()
+                if valide:
+                    return reponse, historique, servi
+                if repli is None or model == strong:
+                    repli = (reponse, historique, servi)
+            if not fort_lance:
+                # Délai écoulé ou réponse rapide invalide : le modèle fort entre en jeu
+                taches.add(asyncio.ensure_future(_tentative(messages, api_key, strong, temperature, valider)))
+                fort_lance = True
+            elif not taches:
+                return repli
+    finally:
+        for tache in taches:
+            tache.cancel()
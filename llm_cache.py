@@ -0,0 +1,156 @@
+import atexit
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# Cache question -> réponse du LLM (TTL + LRU, persistance optionnelle sur disque)
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "1") != "0"
+LLM_CACHE_TTL = float(os.environ.get("LLM_CACHE_TTL", "3600"))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "1000"))
+LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH", "")
+# Délai de regroupement des écritures sur disque (secondes)
+LLM_CACHE_SAVE_DELAY = float(os.environ.get("LLM_CACHE_SAVE_DELAY", "2"))
+
+# Mots qui font référence aux échanges précédents : la question dépend du contexte
+CONTEXT_MARKERS = re.compile(
+    r"\b(ca|cela|celle|celles|celui|ceux|ces|ce resultat|precedent|precedente|dernier resultat|"
+    r"meme|aussi|encore|maintenant|plutot|pareil|idem|la requete|cette requete|it|that|those|same|again)\b"
+)
+
+_entries = OrderedDict()
+_lock = threading.Lock()
+_loaded = False
+_dirty = threading.Event()
+_writer = None
+_save_lock = threading.Lock()
+stats = {"hits": 0, "misses": 0}
+
+
+def normalize_question(question):
+    """Minuscules, sans accents ni ponctuation finale, espaces compactés"""
+    text = unicodedata.normalize("NFKD", question.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip(" ?!.;")
+
+
+def is_cacheable(question, conversation):
+    """Première question de la conversation, ou question sans référence au contexte"""
+    previous_turns = [m for m in conversation if m["role"] != "system"]
+    if not previous_turns:
+        return True
+    return not CONTEXT_MARKERS.search(normalize_question(question))
+
+
+def cache_key(question, model, conversation):
+    """Le prompt système contient rôle, règles et schéma : son empreinte les couvre tous"""
+    system_prompt = conversation[0]["content"] if conversation and conversation[0]["role"] == "system" else ""
+    schema_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+    raw = "\x1f".join([model, schema_hash, normalize_question(question)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _load():
+    global _loaded
+    _loaded = True
+    if not LLM_CACHE_PATH or not os.path.exists(LLM_CACHE_PATH):
+        return
+    try:
+        with open(LLM_CACHE_PATH, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return
+    now = time.time()
+    for key, (value, expires_at) in data.items():
+        if expires_at > now:
+            _entries[key] = (value, expires_at)
+
+
+def _save():
+    """Écrire un instantané du cache, hors du verrou des entrées, via un fichier temporaire renommé"""
+    if not LLM_CACHE_PATH:
+        return
+    with _lock:
+        snapshot = dict(_entries)
+    with _save_lock:
+        tmp_path = f"{LLM_CACHE_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(tmp_path, LLM_CACHE_PATH)
+
+
+def _write_loop():
+    """Regrouper les modifications : une seule écriture par fenêtre de LLM_CACHE_SAVE_DELAY"""
+    while True:
+        _dirty.wait()
+        time.sleep(LLM_CACHE_SAVE_DELAY)
+        _dirty.clear()
+        try:
+            _save()
+        except OSError:
+            pass
+
+
+def _schedule_save():
+    """Signaler une modification au thread d'écriture (à appeler sous _lock)"""
+    global _writer
+    if not LLM_CACHE_PATH:
+        return
+    _dirty.set()
+    if _writer is None:
+        _writer = threading.Thread(target=_write_loop, name="llm-cache-writer", daemon=True)
+        _writer.start()
+
+
+def flush():
+    """Écrire immédiatement les modifications en attente"""
+    if not _dirty.is_set():
+        return
+    _dirty.clear()
+    try:
+        _save()
+    except OSError:
+        pass
+
+
+atexit.register(flush)
+
+
+def get(key):
+    if not LLM_CACHE_ENABLED:
+        return None
+    with _lock:
+        if not _loaded:
+            _load()
+        entry = _entries.get(key)
+        if entry is None or entry[1] <= time.time():
+            _entries.pop(key, None)
+            stats["misses"] += 1
+            return None
+        _entries.move_to_end(key)
+        stats["hits"] += 1
+        return entry[0]
+
+
+def put(key, response):
+    if not LLM_CACHE_ENABLED:
+        return
+    with _lock:
+        if not _loaded:
+            _load()
+        _entries[key] = (response, time.time() + LLM_CACHE_TTL)
+        _entries.move_to_end(key)
+        while len(_entries) > LLM_CACHE_MAX_ENTRIES:
+            _entries.popitem(last=False)
+        _schedule_save()
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+        _schedule_save()
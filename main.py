@@ -1,8 +1,28 @@
-import gradio as gr
-from groq_functions import *
-from mysql_functions import *
-from ui_components import create_interface
+import time
+_debut = time.perf_counter()
+
+import warm_start
+from async_pipeline import GRADIO_CONCURRENCY_LIMIT, GRADIO_MAX_QUEUE
+from metrics import METRICS_ENABLED, authorized
+from starlette.requests import Request
+
+def metrics_endpoint(request: Request):
+    from mysql_functions import metrics_text
+    from starlette.responses import PlainTextResponse
+    if not authorized(request.headers.get("authorization")):
+        return PlainTextResponse("Non autorisé", status_code=401, headers={"WWW-Authenticate": "Bearer"})
+    return PlainTextResponse(metrics_text(), media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
+    # Instantané relu avant la construction de l'interface, revalidé ensuite en tâche de fond
+    warm_start.load()
+    warm_start.revalidate()
+    from ui_components import create_interface
     app = create_interface()
-    app.launch()
\ No newline at end of file
+    app.queue(default_concurrency_limit=GRADIO_CONCURRENCY_LIMIT, max_size=GRADIO_MAX_QUEUE)
+    app.launch(prevent_thread_lock=True)
+    if METRICS_ENABLED:
+        # Route ajoutée au serveur FastAPI de Gradio, à côté de l'interface
+        app.app.add_api_route("/metrics", metrics_endpoint, methods=["GET"])
+    print(f"Interface prête en {time.perf_counter() - _debut:.2f} s")
+    app.block_thread()
@@ -0,0 +1,133 @@
+import bisect
+import functools
+import hmac
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Compteurs et histogrammes en mémoire, exposés au format texte Prometheus sur /metrics
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+# Jeton exigé sur /metrics (en-tête `Authorization: Bearer <jeton>`) ; vide = accès libre
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+# Pied de page des temps par étape dans le chat (valeur par défaut de la case à cocher)
+CHAT_TIMING_FOOTER = os.environ.get("CHAT_TIMING_FOOTER", "0") == "1"
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_lock = threading.Lock()
+_counters = {}    # (nom, labels) -> valeur
+_histograms = {}  # (nom, labels) -> {"buckets": [...], "sum": s, "count": n}
+
+
+def _labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def incr(name, value=1, **labels):
+    if not METRICS_ENABLED or not value:
+        return
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    """Ajouter une mesure (en secondes) à un histogramme"""
+    if not METRICS_ENABLED:
+        return
+    key = (name, _labels(labels))
+    index = bisect.bisect_left(SECONDS_BUCKETS, value)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {"buckets": [0] * len(SECONDS_BUCKETS), "sum": 0.0, "count": 0}
+        if index < len(SECONDS_BUCKETS):
+            histogram["buckets"][index] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+
+@contextmanager
+def span(stage, trace=None, name="stage_seconds", **labels):
+    """Chronométrer un bloc ; la durée est ajoutée à l'histogramme et, si fourni, au dict `trace`"""
+    debut = time.perf_counter()
+    try:
+        yield
+    finally:
+        duree = time.perf_counter() - debut
+        observe(name, duree, stage=stage, **labels)
+        if trace is not None:
+            trace[stage] = trace.get(stage, 0.0) + duree
+
+
+def timed(stage):
+    """Décorateur : chronométrer un gestionnaire (signature conservée pour Gradio)"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def authorized(authorization):
+    """Vérifier l'en-tête Authorization de /metrics lorsque METRICS_TOKEN est défini"""
+    if not METRICS_TOKEN:
+        return True
+    attendu = f"Bearer {METRICS_TOKEN}"
+    return hmac.compare_digest((authorization or "").encode("utf-8"), attendu.encode("utf-8"))
+
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v)}"'.replace("\n", " ") for k, v in items) + "}"
+
+
+def render(gauges=()):
+    """Texte au format d'exposition Prometheus.
+
+    `gauges` : (nom, labels dict, valeur) lus au moment de la requête dans les
+    compteurs des autres modules (caches, pools, files d'attente).
+    """
+    lignes = []
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((key, {**h, "buckets": list(h["buckets"])}) for key, h in _histograms.items())
+
+    vus = set()
+    for (name, labels), value in counters:
+        if name not in vus:
+            lignes.append(f"# TYPE {name} counter")
+            vus.add(name)
+        lignes.append(f"{name}{_format_labels(labels)} {value}")
+
+    for (name, labels), histogram in histograms:
+        if name not in vus:
+            lignes.append(f"# TYPE {name} histogram")
+            vus.add(name)
+        cumul = 0
+        for borne, nombre in zip(SECONDS_BUCKETS, histogram["buckets"]):
+            cumul += nombre
+            lignes.append(f"{name}_bucket{_format_labels(labels, [('le', borne)])} {cumul}")
+        lignes.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram['count']}")
+        lignes.append(f"{name}_sum{_format_labels(labels)} {histogram['sum']:.6f}")
+        lignes.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+
+    for name, labels, value in gauges:
+        if name not in vus:
+            lignes.append(f"# TYPE {name} gauge")
+            vus.add(name)
+        lignes.append(f"{name}{_format_labels(_labels(labels))} {value}")
+    return "\n".join(lignes) + "\n"
+
+
+def timing_footer(trace, prompt_tokens=None, completion_tokens=None):
+    """Pied de page du chat : durée de chaque étape"""
+    parties = [f"{stage} {1000 * duree:.0f} ms" for stage, duree in trace.items()]
+    if prompt_tokens is not None:
+        parties.append(f"~{prompt_tokens}+{completion_tokens or 0} tokens")
+    return "\n\n⏱️ *" + " · ".join(parties) + "*"
@@ -1,244 +1,486 @@
-import mysql.connector
+import asyncio
+import os
+import re
+import time
 import gradio as gr
-from groq_functions import call_groq, extract_sql_query, format_sql_result, clear_conversation
+import llm_cache
+import result_cache
+import warm_start
+from column_profiles import get_profile, render_profile, strip_profile, watch as watch_profile, snapshot as profile_snapshot
+from bulk_import import IMPORT_BATCH_SIZE, lire_apercu, proposer_mapping, importer_fichier
+from async_pipeline import run_db, stage_stats
+from conversation_memory import compact_conversation, conversation_tokens, message_tokens, result_stub
+from llm_cache import is_cacheable, cache_key
+from metrics import CHAT_TIMING_FOOTER, incr, observe, render as render_metrics, span, timed, timing_footer
+from groq_scheduler import scheduler as groq_scheduler
+from hedged_generation import HEDGE_FAST_MODEL, HEDGE_STRONG_MODEL, generer_couverte
+from mysql_pool import connexion, get_pool_stats
+from query_guard import EXPLAINABLE_KEYWORDS, borner_lecture, explain, requete_fenetre, table_derivee, verifier_requete
+from pagination import PAGER_BUFFER_PAGES, session_key, enregistrer, lire_page, libelle_page, source_resultat
+from result_export import exporter
+from result_frames import resultat_dataframe, resume_dataframe
+from schema_cache import get_schema_model, render_schema_prompt, render_schema_display
+from schema_pruning import prune_schema
+from sql_classifier import DDL, READ, WRITE, classify, classify_script, first_keyword
+from groq_functions import call_groq_async, call_groq_stream_async, estimate_tokens, extract_sql_block, extract_sql_query, format_resultat, clear_conversation
+
+# Nombre de lignes lues pour l'affichage et taille des lots de fetchmany
+DISPLAY_LIMIT = int(os.environ.get("SQL_DISPLAY_LIMIT", "50"))
+FETCH_BATCH_SIZE = int(os.environ.get("SQL_FETCH_BATCH_SIZE", "500"))
+
+def _lecture_encapsulable(requete):
+    """Lecture pouvant servir de table dérivée (COUNT, LIMIT/OFFSET)"""
+    return classify(requete) == READ and first_keyword(requete) in ("SELECT", "WITH")
 
 def get_db_schema(host, user, password, db_name):
     try:
-        conn = mysql.connector.connect(
-            host=host,
-            user=user,
-            password=password,
-            database=db_name
-        )
-        cur = conn.cursor(dictionary=True)
-        
-        cur.execute("""
-            SELECT 
-                c.TABLE_NAME, 
-                c.COLUMN_NAME, 
-                c.COLUMN_TYPE, 
-                c.IS_NULLABLE,
-                c.COLUMN_DEFAULT, 
-                c.EXTRA, 
-                c.COLUMN_KEY,
-                tc.CONSTRAINT_TYPE,
-                kcu.REFERENCED_TABLE_NAME, 
-                kcu.REFERENCED_COLUMN_NAME,
-                c.COLUMN_COMMENT
-            FROM information_schema.COLUMNS c
-            LEFT JOIN information_schema.KEY_COLUMN_USAGE kcu
-              ON c.TABLE_SCHEMA = kcu.TABLE_SCHEMA 
-              AND c.TABLE_NAME = kcu.TABLE_NAME
-              AND c.COLUMN_NAME = kcu.COLUMN_NAME
-            LEFT JOIN information_schema.TABLE_CONSTRAINTS tc
-              ON tc.TABLE_SCHEMA = kcu.TABLE_SCHEMA 
-              AND tc.TABLE_NAME = kcu.TABLE_NAME
-              AND tc.CONSTRAINT_NAME = kcu.CONSTRAINT_NAME
-            WHERE c.TABLE_SCHEMA = %s
-            ORDER BY c.TABLE_NAME, c.ORDINAL_POSITION;
-        """, (db_name,))
-        
-        tables = {}
-        for row in cur.fetchall():
-            table_name = row["TABLE_NAME"]
-            if table_name not in tables:
-                tables[table_name] = {
-                    "columns": [],
-                    "primary_keys": [],
-                    "foreign_keys": []
-                }
-            
-            col_info = f"{row['COLUMN_NAME']} {row['COLUMN_TYPE']}"
-            
-            if row['IS_NULLABLE'] == 'NO':
-                col_info += " NOT NULL"
-            
-            if row['COLUMN_DEFAULT'] is not None:
-                col_info += f" DEFAULT {row['COLUMN_DEFAULT']}"
-            
-            if row['EXTRA'] and 'auto_increment' in row['EXTRA'].lower():
-                col_info += " AUTO_INCREMENT"
-            
-            if row['COLUMN_KEY'] == 'PRI' or row['CONSTRAINT_TYPE'] == 'PRIMARY KEY':
-                col_info += " PRIMARY KEY"
-                if row['COLUMN_NAME'] not in tables[table_name]["primary_keys"]:
-                    tables[table_name]["primary_keys"].append(row['COLUMN_NAME'])
-            
-            if row['CONSTRAINT_TYPE'] == 'FOREIGN KEY':
-                col_info += f" REFERENCES {row['REFERENCED_TABLE_NAME']}({row['REFERENCED_COLUMN_NAME']})"
-                fk_info = {
-                    "column": row['COLUMN_NAME'],
-                    "references": f"{row['REFERENCED_TABLE_NAME']}({row['REFERENCED_COLUMN_NAME']})"
-                }
-                if fk_info not in tables[table_name]["foreign_keys"]:
-                    tables[table_name]["foreign_keys"].append(fk_info)
-            
-            if row['COLUMN_COMMENT']:
-                col_info += f" -- {row['COLUMN_COMMENT']}"
-            
-            tables[table_name]["columns"].append(col_info)
-        
-        cur.close()
-        conn.close()
-        
-        # Format simplifié et clair pour l'IA
-        schema_text = f"DATABASE: {db_name}\n\n"
-        
-        for table_name, table_info in tables.items():
-            schema_text += f"TABLE {table_name}:\n"
-            
-            # Colonnes avec leurs types
-            for col in table_info["columns"]:
-                schema_text += f"  {col}\n"
-            
-            schema_text += "\n"
-        
-        return schema_text.strip()
-        
+        model = get_schema_model(host, user, password, db_name)
+        return render_schema_prompt(model)
     except Exception as e:
         return f"Erreur lors de la récupération du schéma : {e}"
 
 def get_db_schema_for_display(host, user, password, db_name):
     """Version pour affichage complet de la structure au chatbot"""
     try:
-        conn = mysql.connector.connect(
-            host=host,
-            user=user,
-            password=password,
-            database=db_name
-        )
-        cur = conn.cursor(dictionary=True)
-        
-        cur.execute("""
-            SELECT 
-                c.TABLE_NAME, 
-                c.COLUMN_NAME, 
-                c.COLUMN_TYPE, 
-                c.IS_NULLABLE,
-                c.COLUMN_DEFAULT, 
-                c.EXTRA, 
-                c.COLUMN_KEY,
-                tc.CONSTRAINT_TYPE,
-                kcu.REFERENCED_TABLE_NAME, 
-                kcu.REFERENCED_COLUMN_NAME,
-                c.COLUMN_COMMENT
-            FROM information_schema.COLUMNS c
-            LEFT JOIN information_schema.KEY_COLUMN_USAGE kcu
-              ON c.TABLE_SCHEMA = kcu.TABLE_SCHEMA 
-              AND c.TABLE_NAME = kcu.TABLE_NAME
-              AND c.COLUMN_NAME = kcu.COLUMN_NAME
-            LEFT JOIN information_schema.TABLE_CONSTRAINTS tc
-              ON tc.TABLE_SCHEMA = kcu.TABLE_SCHEMA 
-              AND tc.TABLE_NAME = kcu.TABLE_NAME
-              AND tc.CONSTRAINT_NAME = kcu.CONSTRAINT_NAME
-            WHERE c.TABLE_SCHEMA = %s
-            ORDER BY c.TABLE_NAME, c.ORDINAL_POSITION;
-        """, (db_name,))
-        
-        tables = {}
-        for row in cur.fetchall():
-            table_name = row["TABLE_NAME"]
-            if table_name not in tables:
-                tables[table_name] = []
-            
-            # Construire l'information de la colonne
-            constraints = []
-            if row['IS_NULLABLE'] == 'NO':
-                constraints.append("NOT NULL")
-            if row['COLUMN_KEY'] == 'PRI' or row['CONSTRAINT_TYPE'] == 'PRIMARY KEY':
-                constraints.append("PRIMARY KEY")
-            if row['EXTRA'] and 'auto_increment' in row['EXTRA'].lower():
-                constraints.append("AUTO_INCREMENT")
-            if row['CONSTRAINT_TYPE'] == 'FOREIGN KEY':
-                constraints.append(f"FK → {row['REFERENCED_TABLE_NAME']}.{row['REFERENCED_COLUMN_NAME']}")
-            if row['COLUMN_DEFAULT'] is not None:
-                constraints.append(f"DEFAULT {row['COLUMN_DEFAULT']}")
-            
-            constraint_text = ', '.join(constraints) if constraints else ""
-            comment_text = row['COLUMN_COMMENT'] if row['COLUMN_COMMENT'] else ""
-            
-            col_info = {
-                'name': row['COLUMN_NAME'],
-                'type': row['COLUMN_TYPE'],
-                'constraints': constraint_text,
-                'comment': comment_text
-            }
-            
-            tables[table_name].append(col_info)
-        
-        cur.close()
-        conn.close()
-        
-        # Construire l'affichage markdown complet
-        display_text = f"# 📊 Structure de la base de données: **{db_name}**\n\n"
-        
-        for table_name, columns in tables.items():
-            display_text += f"## 📋 Table: **{table_name}**\n\n"
-            display_text += "| Colonne | Type | Contraintes | Commentaire |\n"
-            display_text += "|---------|------|-------------|-------------|\n"
-            
-            for col in columns:
-                display_text += f"| {col['name']} | {col['type']} | {col['constraints']} | {col['comment']} |\n"
-            
-            display_text += "\n---\n\n"
-        
-        return display_text
-        
+        model = get_schema_model(host, user, password, db_name)
+        return render_schema_display(model)
     except Exception as e:
         return f"❌ **Erreur lors de la récupération du schéma:** {e}"
 
+@timed("mysql_db_list")
 def update_db_list(host, user, password):
     try:
-        conn = mysql.connector.connect(
-            host=host,
-            user=user,
-            password=password
-        )
-        cur = conn.cursor()
-        cur.execute("SHOW DATABASES;")
-        dbs = [row[0] for row in cur.fetchall()]
-        cur.close()
-        conn.close()
+        with connexion(host, user, password) as conn:
+            cur = conn.cursor()
+            cur.execute("SHOW DATABASES;")
+            dbs = [row[0] for row in cur.fetchall()]
+            cur.close()
+        warm_start.save(host=host, user=user, password=password)
         return gr.update(choices=dbs, value=dbs[0] if dbs else None)
     except Exception as e:
         return gr.update(choices=[], value=None, label=f"Erreur MySQL: {e}")
 
-def schema_and_reset_chat(host, user, password, db_name, custom_role="", custom_rules=""):
+@timed("mysql_schema")
+def schema_and_reset_chat(host, user, password, db_name, custom_role="", custom_rules="", replica_host="", replica_user="", replica_password=""):
     schema = get_db_schema(host, user, password, db_name)
+    mysql_config = {"host": host, "user": user, "password": password, "db_name": db_name,
+                    "replica_host": replica_host, "replica_user": replica_user, "replica_password": replica_password}
+    surveiller_profil(mysql_config)
     conversation = clear_conversation(schema, custom_role, custom_rules)
-    mysql_config = {"host": host, "user": user, "password": password, "db_name": db_name}
+    try:
+        warm_start.save(host=host, user=user, password=password, db_name=db_name,
+                        schema_model=get_schema_model(host, user, password, db_name))
+    except Exception:
+        pass
     return schema, conversation, mysql_config
 
-def executer_requete(host, user, password, db_name, requete):
+def surveiller_profil(mysql_config):
+    """Confier la base au profileur de fond.
+
+    Le profil n'entre pas dans le prompt système gardé en session : il change à
+    chaque passe et ferait varier la clé du cache LLM. `_messages_for_llm`
+    l'ajoute au moment de l'envoi.
+    """
+    if not (mysql_config and mysql_config.get("host") and mysql_config.get("db_name")):
+        return
+    read_from = None
+    if mysql_config.get("replica_host"):
+        read_from = cible_requete(mysql_config, READ)[:3]
+    watch_profile(mysql_config["host"], mysql_config["user"], mysql_config["password"], mysql_config["db_name"], read_from)
+
+def _fetch_bounded(cur, limite, batch_size=FETCH_BATCH_SIZE):
+    """Lire les lignes par lots sans dépasser `limite` (None = tout lire)"""
+    rows = []
+    while limite is None or len(rows) <= limite:
+        taille = batch_size if limite is None else min(batch_size, limite + 1 - len(rows))
+        batch = cur.fetchmany(taille)
+        if not batch:
+            break
+        rows.extend(batch)
+    has_more = limite is not None and len(rows) > limite
+    return rows[:limite] if has_more else rows, has_more
+
+def compter_lignes(host, user, password, db_name, requete):
+    """Nombre total de lignes d'une requête de lecture, calculé côté serveur"""
+    if not _lecture_encapsulable(requete):
+        return None
     try:
-        conn = mysql.connector.connect(
-            host=host,
-            user=user,
-            password=password,
-            database=db_name
-        )
+        with connexion(host, user, password, db_name) as conn:
+            cur = conn.cursor()
+            cur.execute(f"SELECT COUNT(*) FROM {table_derivee(requete, '_total')}")
+            total = cur.fetchone()[0]
+            cur.close()
+        return total
+    except Exception:
+        # Ex. colonnes dupliquées dans une jointure : le total reste inconnu
+        return None
+
+def table_update_times(host, user, password, db_name, tables):
+    """UPDATE_TIME des tables, pour savoir si un résultat en cache est périmé"""
+    if not tables:
+        return {}
+    with connexion(host, user, password, db_name) as conn:
         cur = conn.cursor()
-        cur.execute(requete)
-        if cur.description:
-            colonnes = [desc[0] for desc in cur.description]
-            resultats = cur.fetchall()
-            res = [", ".join(colonnes)] + [", ".join(str(x) for x in row) for row in resultats]
-            retour = "\n".join(res)
-        else:
-            conn.commit()
-            retour = f"Requête exécutée avec succès ({cur.rowcount} lignes affectées)"
+        try:
+            # MySQL 8 garde sinon ces statistiques en cache jusqu'à 24 h
+            cur.execute("SET SESSION information_schema_stats_expiry = 0")
+        except Exception:
+            pass
+        placeholders = ", ".join(["%s"] * len(tables))
+        cur.execute(
+            f"SELECT LOWER(TABLE_NAME), UPDATE_TIME FROM information_schema.TABLES "
+            f"WHERE TABLE_SCHEMA = %s AND LOWER(TABLE_NAME) IN ({placeholders})",
+            (db_name, *sorted(tables))
+        )
+        times = {name: str(update_time) if update_time else None for name, update_time in cur.fetchall()}
         cur.close()
-        conn.close()
-        return retour
+    return times
+
+def executer_requete_resultat(host, user, password, db_name, requete, limite=DISPLAY_LIMIT, compter=True):
+    """Exécuter une requête et retourner un résultat structuré, lu par lots jusqu'à `limite`"""
+    resultat = {"columns": [], "rows": [], "has_more": False, "total": None, "rowcount": 0, "error": None}
+    kind = classify(requete)
+    cacheable = kind == READ and result_cache.is_cacheable(requete)
+
+    def update_times(tables):
+        return table_update_times(host, user, password, db_name, tables)
+
+    if cacheable:
+        try:
+            cached = result_cache.get(host, user, db_name, requete, (limite, compter), update_times)
+        except Exception:
+            cached = None
+        if cached is not None:
+            return cached
+
+    # Lecture bornée côté serveur (LIMIT limite + 1) : aucune ligne ne reste à lire,
+    # la connexion retourne au pool au lieu d'être fermée
+    bornee = None
+    if limite is not None and _lecture_encapsulable(requete):
+        bornee = borner_lecture(requete, limite + 1)
+
+    try:
+        with span("sql_query", name="sql_query_seconds", kind=kind), connexion(host, user, password, db_name) as conn:
+            # Curseur non bufferisé : les lignes restent côté serveur tant qu'on ne les lit pas
+            cur = conn.cursor(buffered=False)
+            cur.execute(bornee or requete)
+            if cur.description:
+                resultat["columns"] = [desc[0] for desc in cur.description]
+                resultat["types"] = [desc[1] for desc in cur.description]
+                resultat["rows"], resultat["has_more"] = _fetch_bounded(cur, limite)
+                if not resultat["has_more"]:
+                    resultat["total"] = len(resultat["rows"])
+                if bornee or not resultat["has_more"]:
+                    # Au plus la fin du résultat à consommer
+                    cur.fetchall()
+                    cur.close()
+                # Sinon, la connexion garde un résultat non lu et le pool la ferme
+            else:
+                conn.commit()
+                resultat["rowcount"] = cur.rowcount
+                cur.close()
     except Exception as e:
-        return f"Erreur : {e}"
+        resultat["error"] = str(e)
+        incr("sql_queries_total", kind=kind, status="error")
+        return resultat
+    incr("sql_queries_total", kind=kind, status="ok")
+    incr("sql_rows_fetched_total", len(resultat["rows"]))
+
+    if resultat["has_more"] and compter:
+        resultat["total"] = compter_lignes(host, user, password, db_name, requete)
+
+    try:
+        if resultat["columns"] and cacheable:
+            result_cache.put(host, user, db_name, requete, (limite, compter), resultat, update_times)
+        elif not resultat["columns"] and kind != READ:
+            # Écriture réussie : les lectures des tables touchées sont périmées
+            result_cache.invalidate(host, db_name, result_cache.referenced_tables(requete))
+    except Exception:
+        pass
+    return resultat
+
+def _resultat_erreur(message):
+    return {"columns": [], "rows": [], "has_more": False, "total": None, "rowcount": 0, "error": message}
+
+def lire_fenetre(source, offset, limite):
+    """Relire une fenêtre de lignes par réécriture LIMIT/OFFSET (requêtes de lecture)"""
+    host, user, password, db_name, requete = source
+    if not _lecture_encapsulable(requete):
+        return _resultat_erreur("Pagination impossible : la requête n'est pas une lecture")
+    return executer_requete_resultat(host, user, password, db_name, requete_fenetre(requete, offset, limite),
+                                     limite=limite, compter=False)
+
+def executer_requete_paginee(espace, host, user, password, db_name, requete, request=None):
+    """Exécuter une requête, garder PAGER_BUFFER_PAGES pages en tampon et retourner la première"""
+    resultat = executer_requete_resultat(host, user, password, db_name, requete,
+                                         limite=DISPLAY_LIMIT * PAGER_BUFFER_PAGES)
+    cle = session_key(request, espace)
+    enregistrer(cle, (host, user, password, db_name, requete), resultat, DISPLAY_LIMIT)
+    page, numero, nb_pages = lire_page(cle, 0, lire_fenetre)
+    return page or resultat, numero, nb_pages
+
+def _resume_page(page, numero, nb_pages):
+    texte = format_resultat(page, avec_tableau=False)
+    if page["columns"] and not page["error"]:
+        texte += f"\n\n*{libelle_page(numero, nb_pages)}*"
+    return texte
+
+def executer_requete(host, user, password, db_name, requete):
+    resultat = executer_requete_resultat(host, user, password, db_name, requete, limite=None)
+    if resultat["error"]:
+        return f"Erreur : {resultat['error']}"
+    if not resultat["columns"]:
+        return f"Requête exécutée avec succès ({resultat['rowcount']} lignes affectées)"
+    res = [", ".join(resultat["columns"])] + [", ".join(str(x) for x in row) for row in resultat["rows"]]
+    return "\n".join(res)
+
+def cible_requete(mysql_config, kind):
+    """(hôte, utilisateur, mot de passe, base) : les lectures vont sur la réplique si elle est configurée"""
+    if kind == READ and mysql_config.get("replica_host"):
+        return (
+            mysql_config["replica_host"],
+            mysql_config.get("replica_user") or mysql_config["user"],
+            mysql_config.get("replica_password") or mysql_config["password"],
+            mysql_config["db_name"]
+        )
+    return mysql_config["host"], mysql_config["user"], mysql_config["password"], mysql_config["db_name"]
+
+def executer_script(mysql_config, script, espace, request=None, garde_fou=True):
+    """Exécuter les instructions d'un script une à une, en routant lectures et écritures.
+
+    Les structures (DDL) et instructions inconnues sont refusées ; l'exécution
+    s'arrête à la première erreur. Retourne une étape par instruction traitée.
+    """
+    etapes = []
+    ecriture_faite = False
+    for statement, kind in classify_script(script):
+        etape = {"statement": statement, "plan": "", "page_num": 0, "nb_pages": None}
+        etapes.append(etape)
+        if kind not in (READ, WRITE):
+            nature = "modification de structure" if kind == DDL else "instruction non reconnue"
+            etape["result"] = _resultat_erreur(f"{nature} refusée : seules les lectures et écritures de données sont autorisées")
+            break
 
-def executer_requete_avec_format(host, user, password, db_name, requete):
+        # Après une écriture, lire sur le primaire pour voir ses propres modifications
+        cible = cible_requete(mysql_config, READ if kind == READ and not ecriture_faite else WRITE)
+        requete = statement
+        if garde_fou:
+            verdict = verifier_requete(*cible, statement)
+            etape["plan"] = verdict["summary"]
+            if not verdict["allowed"]:
+                etape["result"] = _resultat_erreur("requête refusée par le garde-fou (coût estimé trop élevé)")
+                break
+            requete = verdict["requete"]
+
+        if kind == READ:
+            etape["result"], etape["page_num"], etape["nb_pages"] = executer_requete_paginee(espace, *cible, requete, request)
+        else:
+            etape["result"] = executer_requete_resultat(*cible, requete)
+            ecriture_faite = True
+        if etape["result"]["error"]:
+            break
+    return etapes
+
+def _formater_etapes(etapes, avec_tableau=True):
+    """Texte affiché et trace compacte (pour l'historique) des étapes d'un script"""
+    textes = []
+    for etape in etapes:
+        texte = format_resultat(etape["result"], avec_tableau=avec_tableau)
+        if len(etapes) > 1:
+            texte = f"**▶ `{' '.join(etape['statement'].split())[:120]}`**\n\n{texte}"
+        if etape["plan"]:
+            texte = f"{etape['plan']}\n\n{texte}"
+        textes.append(texte)
+    stub = "\n".join(result_stub(etape["result"]) for etape in etapes)
+    return "\n\n".join(textes), stub
+
+@timed("mysql_execute")
+def executer_requete_avec_format(host, user, password, db_name, requete, replica_host="", replica_user="", replica_password="", request: gr.Request = None):
     """Version avec formatage joli pour l'onglet MySQL"""
-    result = executer_requete(host, user, password, db_name, requete)
-    return format_sql_result(result, requete)
+    mysql_config = {"host": host, "user": user, "password": password, "db_name": db_name,
+                    "replica_host": replica_host, "replica_user": replica_user, "replica_password": replica_password}
+    etapes = executer_script(mysql_config, requete, "mysql", request, garde_fou=False)
+    if not etapes:
+        return "*Aucune instruction à exécuter*", gr.update(), gr.update(), 0
+    texte, _ = _formater_etapes(etapes, avec_tableau=False)
+    derniere = etapes[-1]
+    if derniere["result"]["columns"] and not derniere["result"]["error"]:
+        texte += f"\n\n*{libelle_page(derniere['page_num'], derniere['nb_pages'])}*"
+    df = resultat_dataframe(derniere["result"])
+    incr("rendered_bytes_total", len(texte.encode()), tab="mysql")
+    return texte, df, resume_dataframe(df), derniere["page_num"]
+
+@timed("page")
+def changer_page(espace, numero, request=None):
+    """Afficher une autre page du dernier résultat de l'onglet `espace`"""
+    page, numero, nb_pages = lire_page(session_key(request, espace), numero, lire_fenetre)
+    if page is None:
+        return "*Aucun résultat à paginer*", gr.update(), gr.update(), 0
+    df = resultat_dataframe(page)
+    return _resume_page(page, numero, nb_pages), df, resume_dataframe(df), numero
+
+@timed("export")
+def exporter_resultat(espace, format_export, request: gr.Request = None, progress=gr.Progress()):
+    """Exporter en entier le dernier résultat de l'onglet `espace` (fichier à télécharger)"""
+    dernier = source_resultat(session_key(request, espace))
+    if dernier is None:
+        return None, "*Aucun résultat à exporter : exécutez d'abord une requête*"
+    source, total = dernier
+    if classify(source[4]) != READ:
+        return None, "❌ **Seules les lectures peuvent être exportées**"
+    try:
+        path, lignes = exporter(source, format_export, total, progress)
+    except Exception as e:
+        return None, f"❌ **Export impossible :** {e}"
+    return path, f"✅ **{lignes}** ligne(s) exportée(s) en {format_export}"
+
+def tables_import(host, user, password, db_name):
+    """Tables proposées comme cible d'import"""
+    try:
+        model = get_schema_model(host, user, password, db_name)
+        tables = sorted(model["tables"])
+        return gr.update(choices=tables, value=tables[0] if tables else None)
+    except Exception:
+        return gr.update(choices=[], value=None)
+
+@timed("import_analyse")
+def analyser_import(host, user, password, db_name, fichier, table):
+    """Aperçu du fichier et correspondance proposée colonne du fichier -> colonne de la table"""
+    if not fichier or not table:
+        return "*Choisissez un fichier et une table*", gr.update(), gr.update()
+    try:
+        apercu = lire_apercu(fichier)
+        model = get_schema_model(host, user, password, db_name)
+    except Exception as e:
+        return f"❌ **Lecture impossible :** {e}", gr.update(), gr.update()
+    colonnes_table = [col["name"] for col in model["tables"][table]["columns"]]
+    mapping = proposer_mapping(list(apercu.columns), colonnes_table)
+    associees = sum(1 for _, cible in mapping if cible)
+    texte = (f"**{associees}/{len(mapping)}** colonne(s) associée(s) automatiquement. "
+             f"Colonnes de `{table}` : {', '.join(colonnes_table)}\n\n"
+             "*Corrigez la colonne cible si besoin ; laissez-la vide pour ignorer la colonne.*")
+    return texte, apercu, mapping
+
+@timed("import")
+def lancer_import(host, user, password, db_name, fichier, table, mapping, batch_size, mode, progress=gr.Progress()):
+    if not fichier or not table:
+        return "*Choisissez un fichier et une table*"
+    lignes = mapping.values.tolist() if hasattr(mapping, "values") else (mapping or [])
+    mapping = [[str(source), str(cible).strip() if cible is not None and str(cible) != "nan" else ""]
+               for source, cible in lignes]
+    try:
+        model = get_schema_model(host, user, password, db_name)
+        colonnes_table = {col["name"] for col in model["tables"][table]["columns"]}
+    except Exception as e:
+        return f"❌ **Schéma indisponible :** {e}"
+    cibles = [cible for _, cible in mapping if cible]
+    if not cibles:
+        return "❌ **Aucune colonne associée**"
+    inconnues = [c for c in cibles if c not in colonnes_table]
+    if inconnues:
+        return f"❌ **Colonnes absentes de `{table}` :** {', '.join(inconnues)}"
+    if len(set(cibles)) != len(cibles):
+        return "❌ **Une colonne de la table est associée plusieurs fois**"
+
+    bilan = importer_fichier(host, user, password, db_name, fichier, table, mapping,
+                             int(batch_size or IMPORT_BATCH_SIZE), mode, progress)
+    if bilan["lots"]:
+        result_cache.invalidate(host, db_name, {table.lower()})
+    texte = (f"**{bilan['lignes']}** ligne(s) importée(s) dans `{table}` "
+             f"({bilan['lots']} lot(s), {bilan['secondes']:.1f} s)")
+    if bilan["erreur"]:
+        suite = f"\n\n{texte} — les lots précédents sont validés" if bilan["lots"] else ""
+        return f"❌ **Import interrompu :** {bilan['erreur']}{suite}"
+    return f"✅ {texte}"
+
+def etat_serveur():
+    """Charge du pipeline (files d'attente par étape), de l'ordonnanceur Groq et des pools MySQL, en markdown"""
+    lignes = ["| Étape | Limite | En cours | En attente | Attente max | Terminés | Attente moy. | Durée moy. |",
+              "|---|---|---|---|---|---|---|---|"]
+    for name, st in stage_stats().items():
+        lignes.append(f"| {name} | {st['limit']} | {st['active']} | {st['waiting']} | {st['max_waiting']} | "
+                      f"{st['completed']} | {st['mean_wait_ms']:.0f} ms | {st['mean_run_ms']:.0f} ms |")
+    st = groq_scheduler.snapshot()
+    lignes += ["", "| Appels Groq | En file | Bridés | Nouveaux essais (429) | Replis de modèle | Refusés |",
+               "|---|---|---|---|---|---|",
+               f"| {st['requests']} | {st['waiting']} | {st['throttled']} | {st['retries']} | {st['fallbacks']} | {st['rejected']} |"]
+    pools = get_pool_stats()
+    if pools:
+        lignes += ["", "| Pool MySQL | Taille | Utilisées | Libres | Attentes |", "|---|---|---|---|---|"]
+        for name, st in pools.items():
+            lignes.append(f"| {name} | {st['size']} | {st['in_use']} | {st['idle']} | {st['waits']} |")
+    return "\n".join(lignes)
+
+def metrics_text():
+    """Exposition Prometheus : métriques propres et état des files, caches et pools"""
+    gauges = []
+    for name, st in stage_stats().items():
+        for champ in ("waiting", "active", "max_waiting", "completed"):
+            gauges.append((f"pipeline_{champ}", {"stage": name}, st[champ]))
+    for champ, valeur in groq_scheduler.snapshot().items():
+        gauges.append((f"groq_scheduler_{champ}", {}, valeur))
+    for champ, valeur in llm_cache.stats.items():
+        gauges.append((f"llm_cache_{champ}", {}, valeur))
+    for champ, valeur in result_cache.snapshot().items():
+        gauges.append((f"result_cache_{champ}", {}, valeur))
+    for pool, st in get_pool_stats(avec_utilisateur=False).items():
+        for champ, valeur in st.items():
+            gauges.append((f"mysql_pool_{champ}", {"pool": pool}, valeur))
+    for champ, valeur in profile_snapshot().items():
+        gauges.append((f"column_profiler_{champ}", {}, valeur))
+    return render_metrics(gauges)
 
-def groq_chat_interface(message, chat_history, api_key, model, temperature, conversation_state, auto_execute, mysql_config):
+def _executer_pour_chat(mysql_config, sql_query, request):
+    """Exécuter les instructions du chat (garde-fou EXPLAIN compris)"""
+    return executer_script(mysql_config, sql_query, "chat", request)
+
+async def _valider_sql(reponse, mysql_config):
+    """Réponse retenue en mode couverture : SQL de lecture/écriture accepté par un EXPLAIN à blanc"""
+    sql_query = extract_sql_query(reponse)
+    if not sql_query:
+        return False
+    instructions = classify_script(sql_query)
+    if not instructions or any(kind not in (READ, WRITE) for _, kind in instructions):
+        return False
+    if not (mysql_config and mysql_config.get("host") and mysql_config.get("db_name")):
+        return True
+
+    def explain_a_blanc():
+        for statement, kind in instructions:
+            if first_keyword(statement) in EXPLAINABLE_KEYWORDS:
+                explain(*cible_requete(mysql_config, kind), statement)
+
+    try:
+        await run_db(explain_a_blanc)
+    except Exception:
+        return False
+    return True
+
+def _messages_for_llm(conversation_state, mysql_config, question):
+    """Conversation compactée où le schéma du prompt système est réduit aux tables utiles.
+
+    La réduction précède le compactage : le budget se mesure sur le prompt réellement envoyé.
+    """
+    messages = list(conversation_state)
+    if not (mysql_config and mysql_config.get("host") and mysql_config.get("db_name")):
+        return compact_conversation(messages)
+    try:
+        model = get_schema_model(mysql_config["host"], mysql_config["user"], mysql_config["password"], mysql_config["db_name"])
+    except Exception:
+        return compact_conversation(messages)
+    full_schema = render_schema_prompt(model)
+    system_prompt = messages[0]["content"] if messages and messages[0]["role"] == "system" else ""
+    if full_schema and full_schema in system_prompt:
+        pruned = prune_schema(model, question)
+        # Profil le plus récent, restreint aux tables détaillées dans le schéma réduit
+        tables = set(re.findall(r"^TABLE (.+):$", pruned, re.M))
+        profile_text = render_profile(get_profile(mysql_config["host"], mysql_config["user"], mysql_config["db_name"]), tables)
+        if profile_text:
+            pruned = f"{pruned}\n\n{profile_text}"
+        messages[0] = {"role": "system", "content": strip_profile(system_prompt).replace(full_schema, pruned)}
+    return compact_conversation(messages)
+
+async def groq_chat_interface(message, chat_history, api_key, model, temperature, conversation_state, auto_execute, mysql_config, stream=True, hedge=False, timings=CHAT_TIMING_FOOTER, request: gr.Request = None):
     if not conversation_state or len(conversation_state) == 0:
         conversation_state = clear_conversation()
 
@@ -246,47 +488,113 @@ def groq_chat_interface(message, chat_history, api_key, model, temperature, conv
     if any(keyword in message.lower() for keyword in ['structure', 'schéma', 'schema', 'tables', 'affiche les tables', 'montre les tables', 'structure de la base']):
         if mysql_config and mysql_config.get("host") and mysql_config.get("user") and mysql_config.get("db_name"):
             try:
-                structure_display = get_db_schema_for_display(
+                structure_display = await run_db(
+                    get_db_schema_for_display,
                     mysql_config["host"], 
                     mysql_config["user"], 
                     mysql_config["password"], 
                     mysql_config["db_name"]
                 )
                 chat_history.append((message, structure_display))
-                return chat_history, conversation_state
             except Exception as e:
                 error_msg = f"❌ **Erreur:** {str(e)}"
                 chat_history.append((message, error_msg))
-                return chat_history, conversation_state
         else:
             error_msg = "⚠️ **Veuillez d'abord configurer la base de données dans l'onglet 'Base MySQL'**"
             chat_history.append((message, error_msg))
-            return chat_history, conversation_state
+        yield chat_history, conversation_state, gr.update(), gr.update(), gr.update()
+        return
+
+    can_execute = auto_execute and mysql_config and mysql_config.get("host") and mysql_config.get("user") and mysql_config.get("db_name")
+    last_df = page_label = page_num = gr.update()
+    early_query = early_task = None
+    trace = {}
+    debut_tour = time.perf_counter()
+
+    with span("llm_cache", trace, name="chat_stage_seconds"):
+        cacheable = is_cacheable(message, conversation_state)
+        cache_model = f"{HEDGE_FAST_MODEL}+{HEDGE_STRONG_MODEL}" if hedge else model
+        key = cache_key(message, cache_model, conversation_state) if cacheable else None
+        cached_response = llm_cache.get(key) if cacheable else None
+    cache_indicator = ""
+    incr("chat_turns_total", cache="bypass" if not cacheable else ("hit" if cached_response is not None else "miss"))
 
     conversation_state.append({"role": "user", "content": message})
-    response, updated_conversation = call_groq(conversation_state, api_key, model, temperature)
+    with span("schema", trace, name="chat_stage_seconds"):
+        llm_messages = await run_db(_messages_for_llm, conversation_state, mysql_config, message)
+    # Taille du prompt système envoyé : la conversation mémorisée (schéma complet) est compactée sur cette base
+    system_tokens = message_tokens(llm_messages[0]) if llm_messages[0]["role"] == "system" else None
+    prompt_tokens = conversation_tokens(llm_messages)
+    with span("llm", trace, name="chat_stage_seconds"):
+        if cached_response is not None:
+            response = cached_response
+            llm_messages.append({"role": "assistant", "content": response})
+            cache_indicator = "\n\n⚡ *Réponse servie depuis le cache*"
+        elif hedge:
+            chat_history.append((message, f"⏳ *Génération par {HEDGE_FAST_MODEL}, puis {HEDGE_STRONG_MODEL} si besoin…*"))
+            yield chat_history, conversation_state, last_df, page_label, page_num
+            response, llm_messages, modele_retenu = await generer_couverte(
+                llm_messages, api_key, temperature, lambda reponse: _valider_sql(reponse, mysql_config)
+            )
+            chat_history.pop()
+            cache_indicator = f"\n\n🏁 *Réponse retenue : {modele_retenu}*"
+        elif stream:
+            chat_history.append((message, ""))
+            response = ""
+            async for response in call_groq_stream_async(llm_messages, api_key, model, temperature):
+                chat_history[-1] = (message, response)
+                # Lancer l'exécution dès que le bloc ```sql retenu est refermé, sans attendre la fin du flux ;
+                # jamais depuis un bloc encore ouvert (instruction tronquée, WHERE manquant)
+                if can_execute and early_task is None:
+                    early_query = extract_sql_block(response)
+                    if early_query:
+                        early_task = asyncio.ensure_future(run_db(_executer_pour_chat, mysql_config, early_query, request))
+                yield chat_history, conversation_state, last_df, page_label, page_num
+            chat_history.pop()
+        else:
+            response, llm_messages = await call_groq_async(llm_messages, api_key, model, temperature)
+
+    # Seule la réponse rejoint la conversation : le prompt système complet y reste intact
+    if llm_messages[-1]["role"] == "assistant":
+        conversation_state.append(llm_messages[-1])
+    updated_conversation = compact_conversation(conversation_state, head_tokens=system_tokens)
+
+    if cacheable and cached_response is None and updated_conversation[-1]["role"] == "assistant":
+        llm_cache.put(key, response)
+        if llm_cache.LLM_CACHE_ENABLED:
+            cache_indicator += "\n\n🌐 *Réponse générée par le modèle (mise en cache)*"
     
     # Si l'exécution automatique est activée et qu'il y a une requête SQL
-    if auto_execute and mysql_config and mysql_config.get("host") and mysql_config.get("user") and mysql_config.get("db_name"):
+    if can_execute:
         sql_query = extract_sql_query(response)
         if sql_query:
             try:
-                result = executer_requete(
-                    mysql_config["host"], 
-                    mysql_config["user"], 
-                    mysql_config["password"], 
-                    mysql_config["db_name"], 
-                    sql_query
-                )
+                with span("sql", trace, name="chat_stage_seconds"):
+                    if early_task is not None and early_query == sql_query:
+                        etapes = await early_task
+                    else:
+                        etapes = await run_db(_executer_pour_chat, mysql_config, sql_query, request)
                 
-                # Formater le résultat de manière plus jolie
-                formatted_result = format_sql_result(result, sql_query)
-                response += f"\n\n{formatted_result}"
-                updated_conversation[-1]["content"] = response
+                # Formater le résultat de manière plus jolie ; l'historique n'en garde qu'un résumé
+                with span("format", trace, name="chat_stage_seconds"):
+                    formatted_result, stub = _formater_etapes(etapes)
+                    derniere = etapes[-1]
+                    last_df = resultat_dataframe(derniere["result"])
+                    page_label = _resume_page(derniere["result"], derniere["page_num"], derniere["nb_pages"])
+                    page_num = derniere["page_num"]
                 
             except Exception as e:
-                response += f"\n\n❌ **Erreur lors de l'exécution:** {str(e)}"
-                updated_conversation[-1]["content"] = response
+                formatted_result = f"❌ **Erreur lors de l'exécution:** {str(e)}"
+                stub = f"[Erreur SQL : {e}]"
+
+            if updated_conversation[-1]["role"] == "assistant":
+                updated_conversation[-1] = {"role": "assistant", "content": f"{response}\n\n{stub}"}
+            response += f"\n\n{formatted_result}"
     
-    chat_history.append((message, response))
-    return chat_history, updated_conversation
\ No newline at end of file
+    trace["total"] = time.perf_counter() - debut_tour
+    observe("chat_stage_seconds", trace["total"], stage="total")
+    incr("rendered_bytes_total", len((response + cache_indicator).encode()), tab="chat")
+    if timings:
+        cache_indicator += timing_footer(trace, prompt_tokens, estimate_tokens(response))
+    chat_history.append((message, response + cache_indicator))
+    yield chat_history, updated_conversation, last_df, page_label, page_num
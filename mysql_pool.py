@@ -0,0 +1,275 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Paramètres du pool (surchargeables par variables d'environnement)
+POOL_SIZE = int(os.environ.get("MYSQL_POOL_SIZE", "5"))
+POOL_IDLE_TIMEOUT = float(os.environ.get("MYSQL_POOL_IDLE_TIMEOUT", "300"))
+POOL_WAIT_TIMEOUT = float(os.environ.get("MYSQL_POOL_WAIT_TIMEOUT", "10"))
+# Intervalle du ramasse-connexions de fond, qui ferme aussi les inactives des pools délaissés
+POOL_REAP_INTERVAL = float(os.environ.get("MYSQL_POOL_REAP_INTERVAL", "30"))
+# Délai maximal d'exécution d'une requête côté serveur (0 = pas de limite)
+QUERY_TIMEOUT_MS = int(os.environ.get("MYSQL_QUERY_TIMEOUT_MS", "30000"))
+
+
+class PoolTimeoutError(Exception):
+    """Aucune connexion disponible dans le délai imparti"""
+
+
+class ConnectionPool:
+    """Pool de connexions MySQL pour un couple (hôte, utilisateur, base)"""
+
+    def __init__(self, host, user, password, database=None, size=None,
+                 idle_timeout=None, wait_timeout=None):
+        self.host = host
+        self.user = user
+        self.password = password
+        self.database = database
+        self.size = size or POOL_SIZE
+        self.idle_timeout = POOL_IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+        self.wait_timeout = POOL_WAIT_TIMEOUT if wait_timeout is None else wait_timeout
+
+        self._idle = deque()  # (connexion, instant de dernière utilisation)
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self.stats = {
+            "hits": 0,
+            "waits": 0,
+            "creations": 0,
+            "closed_idle": 0,
+            "closed_dead": 0,
+        }
+
+    def _connect(self):
+        # Connecteur importé à la première connexion : l'interface démarre sans l'attendre
+        import mysql.connector
+        params = {"host": self.host, "user": self.user, "password": self.password}
+        if self.database:
+            params["database"] = self.database
+        conn = mysql.connector.connect(**params)
+        if QUERY_TIMEOUT_MS:
+            self._set_query_timeout(conn)
+        return conn
+
+    @staticmethod
+    def _set_query_timeout(conn):
+        """Limiter la durée des requêtes : MySQL (SELECT, en ms) puis MariaDB (toutes, en s)"""
+        import mysql.connector
+        cur = conn.cursor()
+        for statement in (f"SET SESSION max_execution_time = {QUERY_TIMEOUT_MS}",
+                          f"SET SESSION max_statement_time = {QUERY_TIMEOUT_MS / 1000}"):
+            try:
+                cur.execute(statement)
+            except mysql.connector.Error:
+                pass
+        cur.close()
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _expired(self):
+        """Retirer (sous verrou) les connexions inactives depuis plus de idle_timeout ; à fermer hors verrou"""
+        now = time.monotonic()
+        expired = []
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            expired.append(self._idle.popleft()[0])
+            self.stats["closed_idle"] += 1
+        return expired
+
+    def purge_idle(self):
+        """Fermer les connexions inactives depuis plus de idle_timeout"""
+        with self._cond:
+            expired = self._expired()
+        for conn in expired:
+            self._close(conn)
+
+    def acquire(self):
+        deadline = time.monotonic() + self.wait_timeout
+        waited = False
+        while True:
+            expired = []
+            try:
+                with self._cond:
+                    while True:
+                        expired += self._expired()
+                        conn = None
+                        if self._idle:
+                            # Place réservée le temps du ping, fait hors verrou
+                            conn, _ = self._idle.pop()
+                            self._in_use += 1
+                            break
+                        if self._in_use < self.size:
+                            self._in_use += 1
+                            break
+
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise PoolTimeoutError(
+                                f"Pool MySQL saturé ({self.size} connexions) pour {self.user}@{self.host}"
+                            )
+                        if not waited:
+                            self.stats["waits"] += 1
+                            waited = True
+                        self._cond.wait(remaining)
+            finally:
+                for dead in expired:
+                    self._close(dead)
+            if conn is None:
+                break
+
+            # Vérifier que la connexion est toujours vivante (ping) sans bloquer les autres threads
+            if conn.is_connected():
+                with self._cond:
+                    self.stats["hits"] += 1
+                return conn
+            self._close(conn)
+            with self._cond:
+                self._in_use -= 1
+                self.stats["closed_dead"] += 1
+                self._cond.notify()
+
+        # Création hors verrou : le handshake ne bloque pas les autres threads
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self.stats["creations"] += 1
+        return conn
+
+    def release(self, conn, reusable=True):
+        if reusable:
+            try:
+                # Un résultat non lu bloquerait la connexion : on la jette
+                if conn.unread_result:
+                    reusable = False
+                # Terminer la transaction ouverte pour ne pas garder un snapshot périmé
+                elif conn.in_transaction:
+                    conn.rollback()
+            except Exception:
+                reusable = False
+        with self._cond:
+            self._in_use -= 1
+            if reusable:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+        if not reusable:
+            self._close(conn)
+
+    def close_all(self):
+        with self._cond:
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+        for conn in idle:
+            self._close(conn)
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                **self.stats,
+                "size": self.size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_reaper = None
+
+
+def _reap():
+    """Purger périodiquement tous les pools, y compris ceux que plus personne n'emprunte"""
+    while True:
+        time.sleep(POOL_REAP_INTERVAL)
+        with _pools_lock:
+            pools = list(_pools.values())
+        for pool in pools:
+            pool.purge_idle()
+
+
+def get_pool(host, user, password, db_name=None):
+    """Retourner le pool associé à (hôte, utilisateur, base), en le créant si besoin"""
+    global _reaper
+    key = (host, user, db_name or "")
+    ancien = None
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is not None and pool.password != password:
+            # Identifiants modifiés : on repart sur un pool neuf
+            ancien, pool = pool, None
+        if pool is None:
+            pool = ConnectionPool(host, user, password, db_name)
+            _pools[key] = pool
+        if _reaper is None:
+            _reaper = threading.Thread(target=_reap, name="mysql-pool-reaper", daemon=True)
+            _reaper.start()
+    if ancien is not None:
+        ancien.close_all()
+    return pool
+
+
+@contextmanager
+def connexion(host, user, password, db_name=None):
+    """Emprunter une connexion au pool le temps d'un bloc `with`"""
+    import mysql.connector
+    pool = get_pool(host, user, password, db_name)
+    conn = pool.acquire()
+    reusable = True
+    try:
+        yield conn
+    except (mysql.connector.errors.InterfaceError, mysql.connector.errors.OperationalError):
+        # Connexion probablement cassée : ne pas la remettre dans le pool
+        reusable = False
+        raise
+    finally:
+        pool.release(conn, reusable=reusable)
+
+
+@contextmanager
+def sans_delai_requete(conn):
+    """Lever le délai serveur le temps d'un bloc (lectures longues, export), puis le rétablir"""
+    import mysql.connector
+    if not QUERY_TIMEOUT_MS:
+        yield conn
+        return
+    cur = conn.cursor()
+    for statement in ("SET SESSION max_execution_time = 0", "SET SESSION max_statement_time = 0"):
+        try:
+            cur.execute(statement)
+        except mysql.connector.Error:
+            pass
+    cur.close()
+    try:
+        yield conn
+    finally:
+        # Connexion encore occupée par un résultat non lu : le pool la fermera
+        if not conn.unread_result:
+            ConnectionPool._set_query_timeout(conn)
+
+
+def get_pool_stats(avec_utilisateur=True):
+    """Compteurs de tous les pools, pour le dimensionnement.
+
+    Sans utilisateur, les pools d'un même serveur et d'une même base sont additionnés
+    sous l'étiquette `host/db` (exposition publique des métriques).
+    """
+    with _pools_lock:
+        pools = list(_pools.items())
+    if avec_utilisateur:
+        return {f"{user}@{host}/{db}": pool.snapshot() for (host, user, db), pool in pools}
+    totaux = {}
+    for (host, user, db), pool in pools:
+        total = totaux.setdefault(f"{host}/{db}", {})
+        for champ, valeur in pool.snapshot().items():
+            total[champ] = total.get(champ, 0) + valeur
+    return totaux
@@ -0,0 +1,112 @@
+import math
+import os
+import threading
+from collections import OrderedDict
+
+# Nombre de sessions/onglets dont on garde le tampon, et pages lues d'avance
+PAGER_MAX_ENTRIES = int(os.environ.get("PAGER_MAX_ENTRIES", "100"))
+PAGER_BUFFER_PAGES = int(os.environ.get("PAGER_BUFFER_PAGES", "10"))
+
+_buffers = OrderedDict()
+_lock = threading.Lock()
+
+
+def session_key(request, espace):
+    """Clé du tampon : une par session Gradio et par onglet"""
+    session = getattr(request, "session_hash", None) or "default"
+    return (session, espace)
+
+
+def enregistrer(cle, source, resultat, page_size):
+    """Garder le résultat lu (jusqu'à PAGER_BUFFER_PAGES pages) pour la pagination"""
+    if resultat["error"] or not resultat["columns"]:
+        with _lock:
+            _buffers.pop(cle, None)
+        return
+    entry = {
+        "source": source,
+        "columns": resultat["columns"],
+        "types": resultat.get("types"),
+        "offset": 0,
+        "rows": resultat["rows"],
+        "has_more": resultat["has_more"],
+        "total": resultat["total"],
+        "page_size": page_size,
+    }
+    with _lock:
+        _buffers[cle] = entry
+        _buffers.move_to_end(cle)
+        while len(_buffers) > PAGER_MAX_ENTRIES:
+            _buffers.popitem(last=False)
+
+
+def source_resultat(cle):
+    """(source, total) du dernier résultat de `cle`, ou None : sert à relire la requête en entier"""
+    with _lock:
+        entry = _buffers.get(cle)
+        if entry is None:
+            return None
+        return entry["source"], entry["total"]
+
+
+def nombre_pages(entry):
+    if entry["total"] is None:
+        return None
+    return max(1, math.ceil(entry["total"] / entry["page_size"]))
+
+
+def lire_page(cle, numero, fetch_window):
+    """Retourner (résultat de la page, numéro effectif, nombre de pages).
+
+    Les pages présentes dans le tampon sont servies sans requête ; au-delà,
+    `fetch_window(source, offset, limite)` relit une fenêtre LIMIT/OFFSET.
+    """
+    with _lock:
+        entry = _buffers.get(cle)
+        if entry is None:
+            return None, 0, None
+        _buffers.move_to_end(cle)
+
+    page_size = entry["page_size"]
+    nb_pages = nombre_pages(entry)
+    numero = max(0, numero)
+    if nb_pages is not None:
+        numero = min(numero, nb_pages - 1)
+
+    debut = numero * page_size
+    fin_tampon = entry["offset"] + len(entry["rows"])
+    dans_tampon = entry["offset"] <= debut and (debut + page_size <= fin_tampon or not entry["has_more"])
+    if not dans_tampon:
+        fenetre = fetch_window(entry["source"], debut, page_size * PAGER_BUFFER_PAGES)
+        if fenetre["error"]:
+            return fenetre, numero, nb_pages
+        if not fenetre["rows"] and numero > 0:
+            # Au-delà de la dernière page (total inconnu) : rester sur place
+            return lire_page(cle, numero - 1, fetch_window)
+        with _lock:
+            entry["offset"] = debut
+            entry["rows"] = fenetre["rows"]
+            entry["has_more"] = fenetre["has_more"]
+            if not fenetre["has_more"]:
+                # Fin du résultat atteinte : le total (inconnu jusqu'ici) borne désormais les pages
+                entry["total"] = debut + len(fenetre["rows"])
+        nb_pages = nombre_pages(entry)
+        fin_tampon = debut + len(entry["rows"])
+
+    rows = entry["rows"][debut - entry["offset"]:debut - entry["offset"] + page_size]
+    page = {
+        "columns": entry["columns"],
+        "types": entry["types"],
+        "rows": rows,
+        "has_more": debut + len(rows) < fin_tampon or entry["has_more"],
+        "total": entry["total"],
+        "rowcount": 0,
+        "error": None,
+    }
+    return page, numero, nb_pages
+
+
+def libelle_page(numero, nb_pages):
+    if nb_pages is None:
+        return f"Page {numero + 1}"
+    return f"Page {numero + 1}/{nb_pages}"
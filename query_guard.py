@@ -0,0 +1,162 @@
+import os
+
+from mysql_pool import connexion
+from sql_classifier import READ, classify, first_keyword, tokenize
+
+# Seuils du garde-fou appliqué avant l'exécution automatique des requêtes du chat
+GUARD_ENABLED = os.environ.get("GUARD_ENABLED", "1") != "0"
+GUARD_MAX_ROWS_EXAMINED = int(os.environ.get("GUARD_MAX_ROWS_EXAMINED", "1000000"))
+# "refuse" : la requête est rejetée ; "limit" : elle est bornée (LIMIT + MAX_EXECUTION_TIME)
+GUARD_MODE = os.environ.get("GUARD_MODE", "limit")
+GUARD_AUTO_LIMIT = int(os.environ.get("GUARD_AUTO_LIMIT", "1000"))
+GUARD_HINT_TIMEOUT_MS = int(os.environ.get("GUARD_HINT_TIMEOUT_MS", "5000"))
+
+EXPLAINABLE_KEYWORDS = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+def explain(host, user, password, db_name, requete):
+    """Lignes de EXPLAIN (format tabulaire, compris par MySQL et MariaDB)"""
+    with connexion(host, user, password, db_name) as conn:
+        cur = conn.cursor(dictionary=True)
+        cur.execute(f"EXPLAIN {requete.strip().rstrip(';')}")
+        plan = cur.fetchall()
+        cur.close()
+    return plan
+
+
+def estimate_rows_examined(plan):
+    """Lignes examinées estimées : produit cumulé des `rows` d'une jointure imbriquée, sommé par SELECT"""
+    total = 0
+    by_select = {}
+    for row in plan:
+        by_select.setdefault(row.get("id"), []).append(row)
+    for rows in by_select.values():
+        produit = 1
+        for row in rows:
+            estimation = int(row.get("rows") or 1)
+            filtered = float(row.get("filtered") or 100) / 100
+            total += produit * estimation
+            produit *= max(1, int(estimation * filtered))
+    return total
+
+
+def plan_summary(plan, estimated):
+    parts = []
+    for row in plan:
+        if not row.get("table"):
+            continue
+        acces = row.get("type") or "?"
+        index = row.get("key") or "aucun index"
+        parts.append(f"{row['table']} ({acces}, {index}, ~{row.get('rows') or '?'} lignes)")
+    details = " ; ".join(parts) if parts else "aucune table"
+    return f"🔎 *Plan : ~{estimated} lignes examinées — {details}*"
+
+
+# Clauses finales après lesquelles LIMIT ne peut pas être ajouté (FOR SHARE, LOCK IN SHARE MODE, INTO...)
+CLAUSES_SANS_LIMIT = {"FOR", "LOCK", "INTO", "PROCEDURE"}
+
+
+def _sans_point_virgule(requete, tokens):
+    """Retirer le `;` final (un commentaire qui le suivrait est conservé)"""
+    if tokens and tokens[-1][0] == "end":
+        position = tokens.pop()[3]
+        requete = requete[:position] + requete[position + 1:]
+    return requete
+
+
+def _limite_finale(tokens):
+    """Lexèmes qui suivent le LIMIT final de premier niveau (n | o, n | n OFFSET o), None sans LIMIT"""
+    for k, (kind, value, depth, _) in enumerate(tokens):
+        if kind == "word" and value.upper() == "LIMIT" and depth == 0:
+            suite = tokens[k + 1:]
+            if suite and all(v.isdigit() or v.upper() == "OFFSET" or v == "," for _, v, _, _ in suite):
+                return suite
+    return None
+
+
+def table_derivee(requete, alias):
+    """`(requete) AS alias` : `;` final retiré, parenthèse fermante à la ligne (hors d'un `-- ...` final)"""
+    requete = _sans_point_virgule(requete, list(tokenize(requete)))
+    return f"({requete.strip()}\n) AS {alias}"
+
+
+def requete_fenetre(requete, offset, limite):
+    """Fenêtre LIMIT/OFFSET d'une lecture ; une ligne de plus pour savoir s'il en reste"""
+    return f"SELECT * FROM {table_derivee(requete, '_page')} LIMIT {int(limite) + 1} OFFSET {int(offset)}"
+
+
+def borner_lecture(requete, limite):
+    """Lecture renvoyant au plus `limite` lignes : LIMIT ajouté, ou LIMIT existant abaissé.
+
+    Retourne None si la requête se termine par une clause qui interdit d'y ajouter LIMIT.
+    """
+    tokens = list(tokenize(requete))
+    requete = _sans_point_virgule(requete, tokens)
+    if not tokens:
+        return None
+    suite = _limite_finale(tokens)
+    if suite is not None:
+        # Seul le nombre de lignes est abaissé, le décalage éventuel est conservé
+        _, nombre, _, position = suite[2] if len(suite) > 2 and suite[1][1] == "," else suite[0]
+        if int(nombre) <= limite:
+            return requete.strip()
+        return (requete[:position] + str(limite) + requete[position + len(nombre):]).strip()
+    if any(kind == "word" and depth == 0 and value.upper() in CLAUSES_SANS_LIMIT for kind, value, depth, _ in tokens):
+        return None
+    # Un commentaire de fin (`-- ...`) avalerait un LIMIT ajouté sur la même ligne
+    fin_commentee = bool(requete[tokens[-1][3] + len(tokens[-1][1]):].strip())
+    return requete.strip() + ("\n" if fin_commentee else " ") + f"LIMIT {limite}"
+
+
+def add_limits(requete):
+    """Borne une lecture : LIMIT si absent, indice MAX_EXECUTION_TIME pour MySQL"""
+    tokens = list(tokenize(requete))
+    requete = _sans_point_virgule(requete, tokens)
+    words = [t for t in tokens if t[0] == "word"]
+    if not words or words[0][1].upper() not in ("SELECT", "WITH"):
+        return requete.strip()
+
+    if "MAX_EXECUTION_TIME" not in requete.upper():
+        # Indice accepté par le seul SELECT de premier niveau : celui qui suit les CTE pour un WITH
+        principal = next((t for t in words if t[1].upper() == "SELECT" and t[2] == 0), None)
+        if principal is not None:
+            fin = principal[3] + len(principal[1])
+            requete = f"{requete[:fin]} /*+ MAX_EXECUTION_TIME({GUARD_HINT_TIMEOUT_MS}) */{requete[fin:]}"
+    if _limite_finale(tokens) is not None:
+        # LIMIT choisi par l'auteur de la requête : conservé
+        return requete.strip()
+    return borner_lecture(requete, GUARD_AUTO_LIMIT) or requete.strip()
+
+
+def verifier_requete(host, user, password, db_name, requete):
+    """Analyser une requête avant exécution.
+
+    Retourne un dict : `allowed`, `requete` (éventuellement bornée),
+    `estimated` (lignes examinées) et `summary` (texte du plan).
+    """
+    verdict = {"allowed": True, "requete": requete, "estimated": None, "summary": ""}
+    if not GUARD_ENABLED or first_keyword(requete) not in EXPLAINABLE_KEYWORDS:
+        return verdict
+
+    try:
+        plan = explain(host, user, password, db_name, requete)
+    except Exception as e:
+        # Une requête invalide échouera de toute façon à l'exécution, avec un message plus clair
+        verdict["summary"] = f"🔎 *Plan indisponible : {e}*"
+        return verdict
+
+    estimated = estimate_rows_examined(plan)
+    verdict["estimated"] = estimated
+    verdict["summary"] = plan_summary(plan, estimated)
+    if estimated <= GUARD_MAX_ROWS_EXAMINED:
+        return verdict
+
+    is_read = classify(requete) == READ and first_keyword(requete) in ("SELECT", "WITH")
+    if GUARD_MODE == "limit" and is_read:
+        verdict["requete"] = add_limits(requete)
+        verdict["summary"] += f"\n\n⚠️ *Requête coûteuse : bornée à {GUARD_AUTO_LIMIT} lignes et {GUARD_HINT_TIMEOUT_MS} ms*"
+    else:
+        verdict["allowed"] = False
+        verdict["summary"] += (f"\n\n⛔ *Requête refusée : environ {estimated} lignes examinées "
+                               f"(seuil {GUARD_MAX_ROWS_EXAMINED}). Ajoutez un filtre indexé ou une limite.*")
+    return verdict
@@ -0,0 +1,192 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from sql_classifier import EXECUTABLE_COMMENT_RE, tokenize
+
+# Cache des résultats de lecture, borné en mémoire (LRU)
+RESULT_CACHE_ENABLED = os.environ.get("RESULT_CACHE_ENABLED", "1") != "0"
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Durée de vie maximale d'un résultat (secondes) : filet de sécurité si UPDATE_TIME ne bouge pas
+RESULT_CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL", "300"))
+
+# Mots-clés suivis d'une liste de tables (`FROM a, b`, `UPDATE a, b SET`)
+TABLE_LIST_KEYWORDS = {"FROM", "JOIN", "UPDATE", "INTO"}
+# Mots qui terminent une référence de table au lieu d'en être l'alias
+TABLE_REF_STOP = {
+    "WHERE", "JOIN", "INNER", "LEFT", "RIGHT", "CROSS", "NATURAL", "STRAIGHT_JOIN", "OUTER", "ON", "USING",
+    "SET", "GROUP", "ORDER", "LIMIT", "HAVING", "UNION", "EXCEPT", "INTERSECT", "VALUES", "VALUE", "SELECT",
+    "PARTITION", "USE", "FORCE", "IGNORE", "WINDOW", "FOR", "LOCK", "INTO", "FROM", "DUPLICATE", "DUAL",
+}
+# Fonctions dont le résultat change à chaque appel : jamais mis en cache
+VOLATILE_RE = re.compile(
+    r'\b(NOW|SYSDATE|CURDATE|CURTIME|CURRENT_DATE|CURRENT_TIME|CURRENT_TIMESTAMP|UTC_DATE|UTC_TIME|UTC_TIMESTAMP|'
+    r'UNIX_TIMESTAMP|RAND|UUID|UUID_SHORT|CONNECTION_ID|LAST_INSERT_ID|FOUND_ROWS|ROW_COUNT|SLEEP)\s*\(',
+    re.IGNORECASE
+)
+
+_entries = OrderedDict()
+_lock = threading.Lock()
+_size = 0
+stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+
+def normalize_sql(requete):
+    """Clé de la requête : ses lexèmes, sans espaces ni commentaires ordinaires.
+
+    Un commentaire exécutable (`/*!50000 ... */`) dépend de la version du
+    serveur : la requête est alors gardée telle quelle.
+    """
+    if EXECUTABLE_COMMENT_RE.search(requete):
+        return requete.strip()
+    return " ".join(value for kind, value, _, _ in tokenize(requete) if kind != "end")
+
+
+def _table_ref(tokens, i):
+    """Nom de table (sans base ni backquotes) commençant à tokens[i], et position suivante"""
+    if i >= len(tokens) or tokens[i][0] not in ("word", "ident") or tokens[i][1].upper() in TABLE_REF_STOP:
+        return None, i
+    name = tokens[i][1]
+    i += 1
+    # `base`.`table` : l'identifiant après le point
+    while i + 1 < len(tokens) and tokens[i][1] == "." and tokens[i + 1][0] in ("word", "ident"):
+        name = tokens[i + 1][1]
+        i += 2
+    return name.split(".")[-1].strip("`").lower(), i
+
+
+def referenced_tables(requete):
+    """Tables citées après FROM/JOIN/UPDATE/INTO, listes séparées par des virgules comprises"""
+    lexemes = list(tokenize(requete))
+    tokens = [(kind, value) for kind, value, _, _ in lexemes]
+    depths = [depth for _, _, depth, _ in lexemes]
+    tables = set()
+    for i, (kind, value) in enumerate(tokens):
+        if kind != "word" or value.upper() not in TABLE_LIST_KEYWORDS:
+            continue
+        j = i + 1
+        while True:
+            if j < len(tokens) and tokens[j] == ("symbol", "("):
+                # Table dérivée : ses propres FROM sont vus par la boucle principale ; on saute à la parenthèse fermante
+                fermante = next((k for k in range(j + 1, len(tokens))
+                                 if tokens[k] == ("symbol", ")") and depths[k] == depths[j] - 1), None)
+                if fermante is None:
+                    break
+                j = fermante + 1
+            else:
+                name, j = _table_ref(tokens, j)
+                if name is None:
+                    break
+                tables.add(name)
+            # Alias éventuel, puis table suivante de la liste
+            if j < len(tokens) and tokens[j][1].upper() == "AS":
+                j += 1
+            if j < len(tokens) and tokens[j][0] in ("word", "ident") and tokens[j][1].upper() not in TABLE_REF_STOP:
+                j += 1
+            if j < len(tokens) and tokens[j] == ("symbol", ","):
+                j += 1
+                continue
+            break
+    return tables
+
+
+def is_cacheable(requete):
+    return RESULT_CACHE_ENABLED and not VOLATILE_RE.search(requete)
+
+
+def _estimate_size(resultat):
+    size = 200 + sum(len(str(c)) for c in resultat["columns"])
+    for row in resultat["rows"]:
+        size += 64 + sum(len(str(v)) + 16 for v in row)
+    return size
+
+
+def get(host, user, db_name, requete, limite, update_times):
+    """Résultat en cache, ou None.
+
+    `update_times(tables)` retourne les UPDATE_TIME actuels des tables ; si
+    l'un d'eux a bougé depuis la mise en cache, ou si l'entrée a plus de
+    RESULT_CACHE_TTL secondes, elle est invalidée. L'utilisateur MySQL fait
+    partie de la clé : un compte ne reçoit pas les lignes lues avec les droits d'un autre.
+    """
+    key = (host, user, db_name, normalize_sql(requete), limite)
+    with _lock:
+        entry = _entries.get(key)
+    if entry is None:
+        stats["misses"] += 1
+        return None
+
+    if (time.monotonic() - entry["cached_at"] > RESULT_CACHE_TTL
+            or entry["tables"] and update_times(entry["tables"]) != entry["update_times"]):
+        _drop(key)
+        stats["misses"] += 1
+        stats["invalidations"] += 1
+        return None
+
+    with _lock:
+        if key in _entries:
+            _entries.move_to_end(key)
+    stats["hits"] += 1
+    return {**entry["resultat"], "cached": True}
+
+
+def put(host, user, db_name, requete, limite, resultat, update_times):
+    global _size
+    key = (host, user, db_name, normalize_sql(requete), limite)
+    size = _estimate_size(resultat)
+    if size > RESULT_CACHE_MAX_BYTES:
+        return
+    tables = referenced_tables(requete)
+    times = update_times(tables) if tables else None
+    if tables and (set(times) != tables or None in times.values()):
+        # Vue, table hors de la base ou UPDATE_TIME non tenu (InnoDB sous MariaDB) : aucun moyen de voir les écritures
+        return
+    entry = {
+        "resultat": resultat,
+        "tables": tables,
+        "update_times": times,
+        "cached_at": time.monotonic(),
+        "size": size,
+    }
+    with _lock:
+        old = _entries.pop(key, None)
+        if old:
+            _size -= old["size"]
+        _entries[key] = entry
+        _size += size
+        while _size > RESULT_CACHE_MAX_BYTES and _entries:
+            _, evicted = _entries.popitem(last=False)
+            _size -= evicted["size"]
+            stats["evictions"] += 1
+
+
+def _drop(key):
+    global _size
+    with _lock:
+        entry = _entries.pop(key, None)
+        if entry:
+            _size -= entry["size"]
+
+
+def invalidate(host, db_name, tables=None):
+    """Invalider les résultats de la base qui lisent l'une des `tables` (toutes si None).
+
+    L'hôte n'est pas comparé : une lecture servie par une réplique doit être
+    invalidée par une écriture faite sur le serveur principal.
+    """
+    with _lock:
+        keys = [
+            key for key, entry in _entries.items()
+            if key[2] == db_name
+            and (not tables or not entry["tables"] or entry["tables"] & tables)
+        ]
+    for key in keys:
+        _drop(key)
+    stats["invalidations"] += len(keys)
+
+
+def snapshot():
+    with _lock:
+        return {**stats, "entries": len(_entries), "bytes": _size}
@@ -0,0 +1,155 @@
+import csv
+import datetime
+import decimal
+import json
+import os
+import tempfile
+
+from mysql_pool import connexion, sans_delai_requete
+from result_frames import colonne_decimale, nom_type, resultat_dataframe
+
+# Lignes lues (fetchmany) puis écrites par lot : la mémoire ne dépend pas de la taille du résultat
+EXPORT_CHUNK_ROWS = int(os.environ.get("EXPORT_CHUNK_ROWS", "10000"))
+EXPORT_DIR = os.environ.get("EXPORT_DIR") or tempfile.gettempdir()
+
+FORMATS = {"CSV": ".csv", "JSONL": ".jsonl", "Parquet": ".parquet"}
+
+
+def _json_value(value):
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time, datetime.timedelta)):
+        return str(value)
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8", errors="replace")
+    return value
+
+
+def _texte(value):
+    if value is None:
+        return None
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8", errors="replace")
+    return str(value)
+
+
+class _CsvWriter:
+    def __init__(self, path, columns, types):
+        self.f = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.f)
+        self.writer.writerow(columns)
+
+    def write(self, rows):
+        self.writer.writerows([["" if v is None else _texte(v) for v in row] for row in rows])
+
+    def close(self):
+        self.f.close()
+
+
+class _JsonlWriter:
+    def __init__(self, path, columns, types):
+        self.f = open(path, "w", encoding="utf-8")
+        self.columns = columns
+
+    def write(self, rows):
+        self.f.writelines(
+            json.dumps(dict(zip(self.columns, map(_json_value, row))), ensure_ascii=False) + "\n"
+            for row in rows
+        )
+
+    def close(self):
+        self.f.close()
+
+
+class _ParquetWriter:
+    """Un groupe de lignes Parquet par lot ; le schéma est fixé par le premier lot"""
+
+    def __init__(self, path, columns, types):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("l'export Parquet nécessite le paquet pyarrow")
+        self.pa, self.pq = pa, pq
+        self.path = path
+        self.types = types
+        # Parquet refuse les noms de colonnes en double
+        vus = {}
+        self.columns = []
+        for name in columns:
+            vus[name] = vus.get(name, 0) + 1
+            self.columns.append(name if vus[name] == 1 else f"{name}_{vus[name]}")
+        # Dates écrites depuis les valeurs Python : les Timestamp pandas (ns) ne couvrent que 1677–2262
+        types_dates = {"DATE": pa.date32(), "NEWDATE": pa.date32(),
+                       "DATETIME": pa.timestamp("us"), "TIMESTAMP": pa.timestamp("us")}
+        self.dates = [types_dates.get(nom_type(t)) for t in (types or [None] * len(columns))]
+        self.writer = None
+
+    def _table(self, rows):
+        df = resultat_dataframe({"columns": self.columns, "types": self.types, "rows": rows})
+        colonnes = []
+        for i, type_date in enumerate(self.dates):
+            if type_date is not None:
+                colonnes.append(self.pa.array([row[i] for row in rows], type=type_date))
+                continue
+            serie = df.iloc[:, i]
+            # Les Decimal deviennent des colonnes decimal128 ; les autres objets du texte
+            if serie.dtype == object and not colonne_decimale(serie):
+                serie = serie.map(_texte).astype("string")
+            colonnes.append(self.pa.Array.from_pandas(serie))
+        return self.pa.Table.from_arrays(colonnes, names=self.columns)
+
+    def write(self, rows):
+        table = self._table(rows)
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.path, table.schema)
+        else:
+            table = table.cast(self.writer.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is None:
+            # Résultat vide : fichier avec les seules colonnes
+            self.pq.write_table(self._table([]), self.path)
+        else:
+            self.writer.close()
+
+
+_WRITERS = {"CSV": _CsvWriter, "JSONL": _JsonlWriter, "Parquet": _ParquetWriter}
+
+
+def exporter(source, format_export, total=None, progress=None, chunk_rows=None):
+    """Réexécuter la requête `source` et écrire toutes ses lignes dans un fichier.
+
+    Curseur non bufferisé lu par lots de `chunk_rows` lignes, chaque lot étant
+    écrit aussitôt. Retourne (chemin du fichier, nombre de lignes).
+    """
+    host, user, password, db_name, requete = source
+    chunk_rows = chunk_rows or EXPORT_CHUNK_ROWS
+    fd, path = tempfile.mkstemp(prefix=f"export_{db_name}_", suffix=FORMATS[format_export], dir=EXPORT_DIR)
+    os.close(fd)
+
+    lignes = 0
+    try:
+        with connexion(host, user, password, db_name) as conn, sans_delai_requete(conn):
+            cur = conn.cursor(buffered=False)
+            cur.execute(requete)
+            columns = [desc[0] for desc in cur.description]
+            types = [desc[1] for desc in cur.description]
+            writer = _WRITERS[format_export](path, columns, types)
+            try:
+                while True:
+                    rows = cur.fetchmany(chunk_rows)
+                    if not rows:
+                        break
+                    writer.write(rows)
+                    lignes += len(rows)
+                    if progress:
+                        progress(min(1, lignes / total) if total else None, f"{lignes} lignes exportées")
+            finally:
+                writer.close()
+            cur.close()
+    except Exception:
+        os.remove(path)
+        raise
+    return path, lignes
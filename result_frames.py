@@ -0,0 +1,118 @@
+import datetime
+from decimal import Decimal
+
+# Correspondance type MySQL (nom FieldType) -> conversion pandas.
+# DECIMAL reste en objets Decimal : un float64 arrondirait les montants exacts
+_INTEGER_TYPES = {"TINY", "SHORT", "LONG", "LONGLONG", "INT24", "YEAR", "BIT"}
+_FLOAT_TYPES = {"FLOAT", "DOUBLE"}
+_DATETIME_TYPES = {"DATE", "NEWDATE", "DATETIME", "TIMESTAMP"}
+_STRING_TYPES = {"VARCHAR", "VAR_STRING", "STRING", "ENUM", "SET"}
+# Plage des Timestamp pandas (ns) ; au-delà (sentinelles 9999-12-31, 1000-01-01), les dates restent des objets
+_TIMESTAMP_MIN = datetime.datetime(1677, 9, 22)
+_TIMESTAMP_MAX = datetime.datetime(2262, 4, 11)
+
+
+def _date_representable(valeur):
+    if isinstance(valeur, datetime.datetime):
+        valeur = valeur.replace(tzinfo=None)
+    elif isinstance(valeur, datetime.date):
+        valeur = datetime.datetime.combine(valeur, datetime.time())
+    else:
+        return True
+    return _TIMESTAMP_MIN <= valeur <= _TIMESTAMP_MAX
+
+
+def nom_type(type_code):
+    """Nom FieldType d'un code de type MySQL (None si inconnu)"""
+    from mysql.connector import FieldType
+
+    return FieldType.get_info(type_code) if type_code is not None else None
+
+
+def _convert_column(values, type_code):
+    import pandas as pd
+
+    type_name = nom_type(type_code)
+    if type_name in _INTEGER_TYPES:
+        return pd.to_numeric(values, errors="coerce").astype("Int64")
+    if type_name in _FLOAT_TYPES:
+        return pd.to_numeric(values, errors="coerce").astype("float64")
+    if type_name in _DATETIME_TYPES:
+        if all(_date_representable(v) for v in values.dropna()):
+            return pd.to_datetime(values, errors="coerce")
+        return values
+    if type_name == "TIME":
+        return pd.to_timedelta(values, errors="coerce")
+    if type_name in _STRING_TYPES:
+        return values.astype("string")
+    return values
+
+
+def colonne_decimale(series):
+    """Colonne objet ne contenant que des Decimal (et des nuls)"""
+    valeurs = series.dropna()
+    return series.dtype == object and not valeurs.empty and all(isinstance(v, Decimal) for v in valeurs)
+
+
+def colonne_dates(series):
+    """Colonne objet ne contenant que des dates (hors plage des Timestamp) et des nuls"""
+    valeurs = series.dropna()
+    return series.dtype == object and not valeurs.empty and all(isinstance(v, datetime.date) for v in valeurs)
+
+
+def resultat_dataframe(resultat):
+    """DataFrame typé à partir d'un résultat structuré (colonnes en double tolérées)"""
+    import pandas as pd
+
+    if not resultat["columns"]:
+        return pd.DataFrame()
+
+    df = pd.DataFrame.from_records(resultat["rows"], columns=resultat["columns"])
+    types = resultat.get("types") or [None] * len(resultat["columns"])
+    for i, type_code in enumerate(types):
+        df.isetitem(i, _convert_column(df.iloc[:, i], type_code))
+    return df
+
+
+def resume_dataframe(df, top=3):
+    """Statistiques par colonne des lignes reçues : nuls, distincts, min/max et valeurs fréquentes"""
+    import pandas as pd
+
+    if df.empty and not len(df.columns):
+        return pd.DataFrame()
+
+    non_nuls = df.notna().sum()
+    resume = pd.DataFrame({
+        "colonne": df.columns,
+        "type": df.dtypes.astype(str).values,
+        "non_nuls": non_nuls.values,
+        "nuls": (len(df) - non_nuls).values,
+        "distincts": df.nunique(dropna=True).values,
+    })
+
+    # Min/max calculés en bloc sur les colonnes ordonnables
+    positions = [
+        i for i, dtype in enumerate(df.dtypes)
+        if pd.api.types.is_numeric_dtype(dtype)
+        or pd.api.types.is_datetime64_any_dtype(dtype)
+        or pd.api.types.is_timedelta64_dtype(dtype)
+    ]
+    resume["min"] = ""
+    resume["max"] = ""
+    if positions:
+        ordonnables = df.iloc[:, positions]
+        resume.loc[positions, "min"] = ordonnables.min().astype(str).values
+        resume.loc[positions, "max"] = ordonnables.max().astype(str).values
+    # Colonnes d'objets ordonnables (Decimal, dates hors plage) : une par une, nuls exclus
+    for i in range(len(df.columns)):
+        colonne = df.iloc[:, i]
+        if colonne_decimale(colonne) or colonne_dates(colonne):
+            valeurs = colonne.dropna()
+            resume.loc[i, "min"], resume.loc[i, "max"] = str(min(valeurs)), str(max(valeurs))
+
+    resume["valeurs_frequentes"] = [
+        ", ".join(f"{valeur} ({nombre})" for valeur, nombre in df.iloc[:, i].value_counts().head(top).items())
+        for i in range(len(df.columns))
+    ]
+    return resume
+
@@ -0,0 +1,221 @@
+import os
+import threading
+import time
+
+from mysql_pool import connexion
+
+# Délai minimal (secondes) entre deux vérifications d'empreinte pour une même base
+SCHEMA_CHECK_INTERVAL = float(os.environ.get("SCHEMA_CHECK_INTERVAL", "5"))
+
+SCHEMA_QUERY = """
+    SELECT
+        c.TABLE_NAME,
+        c.COLUMN_NAME,
+        c.COLUMN_TYPE,
+        c.IS_NULLABLE,
+        c.COLUMN_DEFAULT,
+        c.EXTRA,
+        c.COLUMN_KEY,
+        tc.CONSTRAINT_TYPE,
+        kcu.REFERENCED_TABLE_NAME,
+        kcu.REFERENCED_COLUMN_NAME,
+        c.COLUMN_COMMENT
+    FROM information_schema.COLUMNS c
+    LEFT JOIN information_schema.KEY_COLUMN_USAGE kcu
+      ON c.TABLE_SCHEMA = kcu.TABLE_SCHEMA
+      AND c.TABLE_NAME = kcu.TABLE_NAME
+      AND c.COLUMN_NAME = kcu.COLUMN_NAME
+    LEFT JOIN information_schema.TABLE_CONSTRAINTS tc
+      ON tc.TABLE_SCHEMA = kcu.TABLE_SCHEMA
+      AND tc.TABLE_NAME = kcu.TABLE_NAME
+      AND tc.CONSTRAINT_NAME = kcu.CONSTRAINT_NAME
+    WHERE c.TABLE_SCHEMA = %s
+    ORDER BY c.TABLE_NAME, c.ORDINAL_POSITION;
+"""
+
+# Requête d'empreinte : un seul passage sur COLUMNS/TABLES, sans jointure
+FINGERPRINT_QUERY = """
+    SELECT
+        (SELECT COUNT(*) FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s) AS nb_tables,
+        (SELECT MAX(CREATE_TIME) FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s) AS last_create,
+        COUNT(*) AS nb_columns,
+        SUM(CRC32(CONCAT_WS(':', TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY))) AS checksum
+    FROM information_schema.COLUMNS
+    WHERE TABLE_SCHEMA = %s;
+"""
+
+_models = {}
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _fingerprint(cur, db_name):
+    cur.execute(FINGERPRINT_QUERY, (db_name, db_name, db_name))
+    row = cur.fetchone()
+    return tuple(str(v) for v in row.values())
+
+
+def build_schema_model(db_name, rows):
+    """Construire le modèle du schéma à partir des lignes de SCHEMA_QUERY"""
+    tables = {}
+    for row in rows:
+        table_name = row["TABLE_NAME"]
+        if table_name not in tables:
+            tables[table_name] = {
+                "columns": [],
+                "primary_keys": [],
+                "foreign_keys": []
+            }
+        table = tables[table_name]
+
+        is_primary = row['COLUMN_KEY'] == 'PRI' or row['CONSTRAINT_TYPE'] == 'PRIMARY KEY'
+        is_foreign = row['CONSTRAINT_TYPE'] == 'FOREIGN KEY'
+
+        # Une colonne peut apparaître plusieurs fois (une ligne par contrainte)
+        column = next((c for c in table["columns"] if c["name"] == row['COLUMN_NAME']), None)
+        if column is None:
+            column = {
+                "name": row['COLUMN_NAME'],
+                "type": row['COLUMN_TYPE'],
+                "nullable": row['IS_NULLABLE'] != 'NO',
+                "default": row['COLUMN_DEFAULT'],
+                "auto_increment": bool(row['EXTRA'] and 'auto_increment' in row['EXTRA'].lower()),
+                "primary_key": False,
+                "references": None,
+                "comment": row['COLUMN_COMMENT'] or "",
+            }
+            table["columns"].append(column)
+
+        if is_primary:
+            column["primary_key"] = True
+            if row['COLUMN_NAME'] not in table["primary_keys"]:
+                table["primary_keys"].append(row['COLUMN_NAME'])
+
+        if is_foreign:
+            column["references"] = (row['REFERENCED_TABLE_NAME'], row['REFERENCED_COLUMN_NAME'])
+            fk_info = {
+                "column": row['COLUMN_NAME'],
+                "references": f"{row['REFERENCED_TABLE_NAME']}({row['REFERENCED_COLUMN_NAME']})"
+            }
+            if fk_info not in table["foreign_keys"]:
+                table["foreign_keys"].append(fk_info)
+
+    return {"db_name": db_name, "tables": tables}
+
+
+def render_column_prompt(col):
+    col_info = f"{col['name']} {col['type']}"
+    if not col["nullable"]:
+        col_info += " NOT NULL"
+    if col["default"] is not None:
+        col_info += f" DEFAULT {col['default']}"
+    if col["auto_increment"]:
+        col_info += " AUTO_INCREMENT"
+    if col["primary_key"]:
+        col_info += " PRIMARY KEY"
+    if col["references"]:
+        col_info += f" REFERENCES {col['references'][0]}({col['references'][1]})"
+    if col["comment"]:
+        col_info += f" -- {col['comment']}"
+    return col_info
+
+
+def render_schema_prompt(model):
+    """Format simplifié et clair pour l'IA"""
+    schema_text = f"DATABASE: {model['db_name']}\n\n"
+
+    for table_name, table_info in model["tables"].items():
+        schema_text += f"TABLE {table_name}:\n"
+        for col in table_info["columns"]:
+            schema_text += f"  {render_column_prompt(col)}\n"
+        schema_text += "\n"
+
+    return schema_text.strip()
+
+
+def render_schema_display(model):
+    """Affichage markdown complet de la structure"""
+    display_text = f"# 📊 Structure de la base de données: **{model['db_name']}**\n\n"
+
+    for table_name, table_info in model["tables"].items():
+        display_text += f"## 📋 Table: **{table_name}**\n\n"
+        display_text += "| Colonne | Type | Contraintes | Commentaire |\n"
+        display_text += "|---------|------|-------------|-------------|\n"
+
+        for col in table_info["columns"]:
+            constraints = []
+            if not col["nullable"]:
+                constraints.append("NOT NULL")
+            if col["primary_key"]:
+                constraints.append("PRIMARY KEY")
+            if col["auto_increment"]:
+                constraints.append("AUTO_INCREMENT")
+            if col["references"]:
+                constraints.append(f"FK → {col['references'][0]}.{col['references'][1]}")
+            if col["default"] is not None:
+                constraints.append(f"DEFAULT {col['default']}")
+            constraint_text = ', '.join(constraints)
+            display_text += f"| {col['name']} | {col['type']} | {constraint_text} | {col['comment']} |\n"
+
+        display_text += "\n---\n\n"
+
+    return display_text
+
+
+def _lock_for(key):
+    with _locks_guard:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def get_schema_model(host, user, password, db_name, force=False, recheck=False):
+    """Modèle du schéma en cache, reconstruit seulement si l'empreinte a changé.
+
+    `recheck` compare l'empreinte sans attendre SCHEMA_CHECK_INTERVAL ;
+    `force` reconstruit le modèle dans tous les cas.
+    """
+    key = (host, db_name)
+    with _lock_for(key):
+        entry = _models.get(key)
+        now = time.monotonic()
+        if entry and not force and not recheck and now - entry["checked_at"] < SCHEMA_CHECK_INTERVAL:
+            return entry["model"]
+
+        with connexion(host, user, password, db_name) as conn:
+            cur = conn.cursor(dictionary=True)
+            fingerprint = _fingerprint(cur, db_name)
+            if entry and not force and entry["fingerprint"] == fingerprint:
+                cur.close()
+                entry["checked_at"] = now
+                return entry["model"]
+
+            cur.execute(SCHEMA_QUERY, (db_name,))
+            rows = cur.fetchall()
+            cur.close()
+
+        model = build_schema_model(db_name, rows)
+        model["fingerprint"] = fingerprint
+        _models[key] = {"model": model, "fingerprint": fingerprint, "checked_at": now}
+        return model
+
+
+def seed_schema(host, db_name, model):
+    """Amorcer le cache avec un modèle enregistré (démarrage à chaud).
+
+    Le modèle n'est jamais servi sans vérification : le premier accès compare
+    l'empreinte avec les identifiants de l'appelant, et seule la requête
+    complète du schéma est évitée.
+    """
+    model = {**model, "fingerprint": tuple(model.get("fingerprint") or ())}
+    # Le JSON a transformé les tuples en listes
+    for table in model["tables"].values():
+        for col in table["columns"]:
+            if col["references"]:
+                col["references"] = tuple(col["references"])
+    key = (host, db_name)
+    with _lock_for(key):
+        if key not in _models:
+            _models[key] = {"model": model, "fingerprint": model["fingerprint"], "checked_at": float("-inf")}
+
+
+def invalidate_schema(host, db_name):
+    _models.pop((host, db_name), None)
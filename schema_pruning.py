@@ -0,0 +1,134 @@
+import math
+import os
+import re
+import unicodedata
+
+from groq_functions import estimate_tokens
+from schema_cache import render_column_prompt
+
+# Budget (en tokens) du schéma envoyé au modèle pour une question
+SCHEMA_TOKEN_BUDGET = int(os.environ.get("SCHEMA_TOKEN_BUDGET", "3000"))
+
+# Poids des correspondances selon l'endroit où le mot apparaît
+TABLE_WEIGHT = 3.0
+COLUMN_WEIGHT = 1.5
+COMMENT_WEIGHT = 1.0
+
+STOP_WORDS = {
+    "le", "la", "les", "un", "une", "des", "de", "du", "d", "l", "et", "ou", "a", "au", "aux",
+    "en", "par", "pour", "avec", "sans", "sur", "dans", "qui", "que", "quoi", "quel", "quels",
+    "quelle", "quelles", "est", "sont", "moi", "me", "tous", "toutes", "tout", "montre", "affiche",
+    "donne", "liste", "combien", "the", "of", "and", "all", "show", "list", "id",
+}
+
+_indexes = {}
+
+
+def tokenize(text):
+    """Mots normalisés : minuscules, sans accents, découpés sur _ et la ponctuation"""
+    text = unicodedata.normalize("NFKD", str(text).lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"([a-z])([0-9])", r"\1 \2", text)
+    words = []
+    for word in re.split(r"[^a-z0-9]+", text):
+        if len(word) < 2 or word in STOP_WORDS:
+            continue
+        # Pluriels simples : produits -> produit, prix reste prix
+        if len(word) > 3 and word[-1] in "sx" and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+
+def build_index(model):
+    """Index inversé mot -> {table: poids}, plus le graphe des clés étrangères"""
+    postings = {}
+    neighbours = {name: set() for name in model["tables"]}
+
+    def add(word, table, weight):
+        table_weights = postings.setdefault(word, {})
+        table_weights[table] = table_weights.get(table, 0) + weight
+
+    for table_name, table in model["tables"].items():
+        for word in tokenize(table_name):
+            add(word, table_name, TABLE_WEIGHT)
+        for col in table["columns"]:
+            for word in tokenize(col["name"]):
+                add(word, table_name, COLUMN_WEIGHT)
+            for word in tokenize(col["comment"]):
+                add(word, table_name, COMMENT_WEIGHT)
+            if col["references"] and col["references"][0] in neighbours:
+                neighbours[table_name].add(col["references"][0])
+                neighbours[col["references"][0]].add(table_name)
+
+    rendered = {
+        name: f"TABLE {name}:\n" + "".join(f"  {render_column_prompt(col)}\n" for col in table["columns"])
+        for name, table in model["tables"].items()
+    }
+    return {
+        "postings": postings,
+        "neighbours": neighbours,
+        "rendered": rendered,
+        "tokens": {name: estimate_tokens(text) for name, text in rendered.items()},
+        "nb_tables": len(model["tables"]),
+    }
+
+
+def get_index(model):
+    key = (model["db_name"], model.get("fingerprint"))
+    index = _indexes.get(key)
+    if index is None:
+        if len(_indexes) >= 16:
+            _indexes.pop(next(iter(_indexes)))
+        index = _indexes[key] = build_index(model)
+    return index
+
+
+def score_tables(index, question):
+    """Score TF-IDF simple de chaque table pour la question"""
+    scores = {}
+    for word in set(tokenize(question)):
+        table_weights = index["postings"].get(word)
+        if not table_weights:
+            continue
+        idf = math.log(1 + index["nb_tables"] / len(table_weights))
+        for table, weight in table_weights.items():
+            scores[table] = scores.get(table, 0) + weight * idf
+    return scores
+
+
+def prune_schema(model, question, budget=None):
+    """Schéma réduit aux tables pertinentes et à leurs voisines de jointure.
+
+    Retourne le texte complet si le schéma tient déjà dans le budget.
+    """
+    budget = budget or SCHEMA_TOKEN_BUDGET
+    index = get_index(model)
+    header = f"DATABASE: {model['db_name']}\n\n"
+    if sum(index["tokens"].values()) <= budget:
+        return header + "\n".join(index["rendered"].values()).strip()
+
+    scores = score_tables(index, question)
+    ranked = sorted(scores, key=lambda t: -scores[t])
+    # Les voisines (clés étrangères) des tables retenues suivent, pour permettre les JOIN
+    candidates = list(ranked)
+    for table in ranked:
+        for neighbour in sorted(index["neighbours"][table]):
+            if neighbour not in candidates:
+                candidates.append(neighbour)
+
+    selected = []
+    used = estimate_tokens(header)
+    for table in candidates:
+        if used + index["tokens"][table] > budget:
+            continue
+        selected.append(table)
+        used += index["tokens"][table]
+
+    schema_text = header + "\n".join(index["rendered"][t] for t in selected)
+    others = [t for t in model["tables"] if t not in selected]
+    if others:
+        others_line = "\nAUTRES TABLES (colonnes non détaillées): " + ", ".join(others)
+        if used + estimate_tokens(others_line) <= budget:
+            schema_text += others_line
+    return schema_text.strip()
@@ -0,0 +1,147 @@
+# Découpage et classification des requêtes SQL en une seule passe.
+# Le tokenizer connaît les chaînes ('...', "..."), les identifiants `...`,
+# les commentaires (-- , #, /* */) et la profondeur des parenthèses : un
+# point-virgule dans une chaîne ou un mot-clé dans un commentaire ne
+# trompent donc pas la classification. Les commentaires exécutables
+# (/*! ... */, /*M! ... */) sont exécutés par le serveur : leur contenu est
+# analysé comme le reste de l'instruction.
+import re
+
+READ = "read"
+WRITE = "write"
+DDL = "ddl"
+UNKNOWN = "unknown"
+
+READ_KEYWORDS = {"SELECT", "SHOW", "DESCRIBE", "DESC", "EXPLAIN"}
+WRITE_KEYWORDS = {"INSERT", "UPDATE", "DELETE", "REPLACE"}
+DDL_KEYWORDS = {"CREATE", "ALTER", "DROP", "TRUNCATE", "RENAME"}
+STATEMENT_KEYWORDS = READ_KEYWORDS | WRITE_KEYWORDS | DDL_KEYWORDS | {"WITH"}
+
+EXECUTABLE_COMMENT_RE = re.compile(r"/\*M?!\d*")
+
+
+def tokenize(sql):
+    """Produire (type, valeur, profondeur, position) ; type parmi word, string, ident, symbol, end.
+
+    Les commentaires et espaces sont ignorés ; `end` marque un `;` de fin d'instruction.
+    """
+    i = 0
+    n = len(sql)
+    depth = 0
+    executable = False
+    while i < n:
+        c = sql[i]
+        if c.isspace():
+            i += 1
+        elif c == "/" and EXECUTABLE_COMMENT_RE.match(sql, i):
+            # /*!50000 ... */ : marqueur et version sautés, contenu tokenisé
+            i = EXECUTABLE_COMMENT_RE.match(sql, i).end()
+            executable = True
+        elif executable and c == "*" and sql.startswith("*/", i):
+            executable = False
+            i += 2
+        elif c == "#" or (c == "-" and sql.startswith("--", i) and (i + 2 >= n or sql[i + 2].isspace())):
+            end = sql.find("\n", i)
+            i = n if end == -1 else end + 1
+        elif c == "/" and sql.startswith("/*", i):
+            end = sql.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+        elif c in ("'", '"', "`"):
+            j = i + 1
+            while j < n:
+                if sql[j] == "\\" and c != "`":
+                    j += 2
+                    continue
+                if sql[j] == c:
+                    # Guillemet doublé = guillemet échappé
+                    if j + 1 < n and sql[j + 1] == c:
+                        j += 2
+                        continue
+                    break
+                j += 1
+            yield ("ident" if c == "`" else "string", sql[i:j + 1], depth, i)
+            i = j + 1
+        elif c.isalnum() or c in "_$@":
+            j = i + 1
+            while j < n and (sql[j].isalnum() or sql[j] in "_$@."):
+                j += 1
+            yield ("word", sql[i:j], depth, i)
+            i = j
+        elif c == ";":
+            yield ("end", c, depth, i)
+            i += 1
+        else:
+            if c == "(":
+                depth += 1
+            elif c == ")":
+                depth = max(0, depth - 1)
+            yield ("symbol", c, depth, i)
+            i += 1
+
+
+def split_statements(sql):
+    """Découper un texte en instructions (texte d'origine, sans le `;` final)"""
+    statements = []
+    start = 0
+    has_tokens = False
+    for kind, _, _, position in tokenize(sql):
+        if kind == "end":
+            if has_tokens:
+                statements.append(sql[start:position].strip())
+            start = position + 1
+            has_tokens = False
+        else:
+            has_tokens = True
+    if has_tokens:
+        statements.append(sql[start:].strip())
+    return statements
+
+
+def classify(statement):
+    """Classer une instruction : READ, WRITE, DDL ou UNKNOWN"""
+    tokens = [(value.upper(), depth, position) for kind, value, depth, position in tokenize(statement) if kind == "word"]
+    words = [(value, depth) for value, depth, _ in tokens]
+    if not words:
+        return UNKNOWN
+
+    first = words[0][0]
+    if first in ("EXPLAIN", "DESCRIBE", "DESC") and len(words) > 1 and words[1][0] == "ANALYZE":
+        # EXPLAIN ANALYZE exécute réellement l'instruction analysée : c'est elle qui décide
+        cible = next((position for value, _, position in tokens[2:] if value in STATEMENT_KEYWORDS), None)
+        return UNKNOWN if cible is None else classify(statement[cible:])
+    if first == "WITH":
+        # Après la liste des CTE, le premier mot-clé d'instruction hors parenthèses décide
+        main = next((w for w, depth in words[1:] if depth == 0 and w in STATEMENT_KEYWORDS - {"WITH"}), None)
+        if main is None:
+            return UNKNOWN
+        first = main
+
+    if first in WRITE_KEYWORDS:
+        return WRITE
+    if first in DDL_KEYWORDS:
+        return DDL
+    if first in READ_KEYWORDS:
+        upper_words = [w for w, _ in words]
+        # SELECT ... INTO OUTFILE / @var, FOR UPDATE, LOCK IN SHARE MODE : pas une simple lecture
+        if first == "SELECT" and ("INTO" in upper_words or _has_sequence(upper_words, ("FOR", "UPDATE"))
+                                  or _has_sequence(upper_words, ("LOCK", "IN", "SHARE", "MODE"))):
+            return WRITE
+        return READ
+    return UNKNOWN
+
+
+def _has_sequence(words, sequence):
+    size = len(sequence)
+    return any(tuple(words[i:i + size]) == sequence for i in range(len(words) - size + 1))
+
+
+def first_keyword(text):
+    """Premier mot (en majuscules) d'un texte, commentaires ignorés"""
+    for kind, value, _, _ in tokenize(text):
+        return value.upper() if kind == "word" else None
+    return None
+
+
+def classify_script(sql):
+    """Liste de (instruction, classe) pour chaque instruction du texte"""
+    return [(statement, classify(statement)) for statement in split_statements(sql)]
@@ -0,0 +1,28 @@
+from query_guard import add_limits, borner_lecture, requete_fenetre, table_derivee
+
+
+def test_table_derivee_apres_commentaire_final():
+    assert table_derivee("SELECT * FROM t -- tous", "_total") == "(SELECT * FROM t -- tous\n) AS _total"
+    assert table_derivee("SELECT * FROM t; -- fin", "_page") == "(SELECT * FROM t -- fin\n) AS _page"
+    assert table_derivee("SELECT ';' FROM t;", "_page") == "(SELECT ';' FROM t\n) AS _page"
+
+
+def test_fenetre_d_une_requete_commentee():
+    assert requete_fenetre("SELECT * FROM t ORDER BY id -- par id", 100, 50) == (
+        "SELECT * FROM (SELECT * FROM t ORDER BY id -- par id\n) AS _page LIMIT 51 OFFSET 100"
+    )
+
+
+def test_borner_lecture():
+    assert borner_lecture("SELECT * FROM t -- tous", 51) == "SELECT * FROM t -- tous\nLIMIT 51"
+    assert borner_lecture("SELECT * FROM t LIMIT 10;", 51) == "SELECT * FROM t LIMIT 10"
+    assert borner_lecture("SELECT * FROM t LIMIT 20, 1000", 51) == "SELECT * FROM t LIMIT 20, 51"
+    assert borner_lecture("SELECT a FROM (SELECT a FROM t LIMIT 5) s", 51) == "SELECT a FROM (SELECT a FROM t LIMIT 5) s LIMIT 51"
+    assert borner_lecture("SELECT * FROM t FOR SHARE", 51) is None
+
+
+def test_add_limits_indice_apres_les_cte():
+    assert add_limits("WITH c AS (SELECT 1 x) SELECT * FROM c") == (
+        "WITH c AS (SELECT 1 x) SELECT /*+ MAX_EXECUTION_TIME(5000) */ * FROM c LIMIT 1000"
+    )
+    assert add_limits("SELECT * FROM t LIMIT 5000 -- x") == "SELECT /*+ MAX_EXECUTION_TIME(5000) */ * FROM t LIMIT 5000 -- x"
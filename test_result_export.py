@@ -0,0 +1,24 @@
+import datetime
+
+import pytest
+
+pytest.importorskip("pyarrow")
+pytest.importorskip("mysql.connector")
+
+import pyarrow.parquet as pq
+
+from result_export import _ParquetWriter
+
+LONG, DATE, DATETIME = 3, 10, 12
+
+
+def test_parquet_conserve_les_dates_hors_plage(tmp_path):
+    path = str(tmp_path / "export.parquet")
+    writer = _ParquetWriter(path, ["id", "fin", "maj"], [LONG, DATE, DATETIME])
+    writer.write([(1, datetime.date(2024, 5, 1), datetime.datetime(2024, 5, 1, 12, 30))])
+    writer.write([(2, datetime.date(9999, 12, 31), datetime.datetime(1000, 1, 1)), (3, None, None)])
+    writer.close()
+
+    lignes = pq.read_table(path).to_pylist()
+    assert lignes[1] == {"id": 2, "fin": datetime.date(9999, 12, 31), "maj": datetime.datetime(1000, 1, 1)}
+    assert lignes[2]["fin"] is None
@@ -0,0 +1,31 @@
+import datetime
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip("pandas")
+pytest.importorskip("mysql.connector")
+
+from result_frames import resultat_dataframe, resume_dataframe
+
+DATE, DATETIME, NEWDECIMAL = 10, 12, 246
+
+
+def test_dates_hors_plage_conservees():
+    rows = [(datetime.date(9999, 12, 31), datetime.datetime(1000, 1, 1, 0, 0)), (None, None)]
+    df = resultat_dataframe({"columns": ["fin", "debut"], "types": [DATE, DATETIME], "rows": rows})
+    assert df["fin"].tolist()[0] == datetime.date(9999, 12, 31)
+    assert df["debut"].tolist()[0] == datetime.datetime(1000, 1, 1)
+    resume = resume_dataframe(df)
+    assert resume["nuls"].tolist() == [1, 1]
+    assert resume["max"].tolist()[0] == "9999-12-31"
+
+
+def test_dates_dans_la_plage_converties():
+    df = resultat_dataframe({"columns": ["d"], "types": [DATE], "rows": [(datetime.date(2024, 5, 1),)]})
+    assert str(df["d"].dtype).startswith("datetime64")
+
+
+def test_decimal_exact():
+    df = resultat_dataframe({"columns": ["prix"], "types": [NEWDECIMAL], "rows": [(Decimal("12345678901234567.89"),)]})
+    assert df["prix"].tolist() == [Decimal("12345678901234567.89")]
@@ -0,0 +1,43 @@
+from sql_classifier import DDL, READ, UNKNOWN, WRITE, classify, classify_script, first_keyword, split_statements
+
+
+def test_lectures_simples():
+    assert classify("SELECT * FROM clients") == READ
+    assert classify("SHOW TABLES") == READ
+    assert classify("EXPLAIN DELETE FROM clients") == READ
+    assert classify("WITH c AS (SELECT 1) SELECT * FROM c") == READ
+
+
+def test_ecritures_et_ddl():
+    assert classify("DELETE FROM clients WHERE id = 5") == WRITE
+    assert classify("WITH c AS (SELECT 1) DELETE FROM t") == WRITE
+    assert classify("SELECT * FROM t INTO OUTFILE '/tmp/x'") == WRITE
+    assert classify("SELECT * FROM t FOR UPDATE") == WRITE
+    assert classify("DROP TABLE clients") == DDL
+    assert classify("GRANT ALL ON *.* TO x") == UNKNOWN
+
+
+def test_chaines_et_commentaires_ordinaires():
+    assert classify("SELECT 'DELETE FROM t; DROP TABLE t' FROM dual") == READ
+    assert classify("SELECT 1 /* DELETE FROM t */") == READ
+    assert classify("-- DROP TABLE t\nSELECT 1") == READ
+    assert split_statements("SELECT ';'; SELECT 2") == ["SELECT ';'", "SELECT 2"]
+
+
+def test_commentaire_executable_analyse():
+    assert classify("SELECT * FROM t /*!50000 INTO OUTFILE '/tmp/x' */") == WRITE
+    assert classify("/*!50000 DELETE FROM t */") == WRITE
+    assert classify("/*M!100101 DROP TABLE t */") == DDL
+    assert classify_script("/*!50000 DELETE FROM t */") == [("/*!50000 DELETE FROM t */", WRITE)]
+    assert first_keyword("/*! DELETE FROM t */") == "DELETE"
+
+
+def test_indication_optimiseur_reste_un_commentaire():
+    assert classify("SELECT /*+ MAX_EXECUTION_TIME(1000) */ * FROM t") == READ
+
+
+def test_explain_analyze_classe_l_instruction_cible():
+    assert classify("EXPLAIN ANALYZE DELETE FROM t") == WRITE
+    assert classify("EXPLAIN ANALYZE SELECT * FROM t") == READ
+    assert classify("EXPLAIN ANALYZE FORMAT=TREE UPDATE t SET a = 1") == WRITE
+    assert classify("EXPLAIN ANALYZE") == UNKNOWN
@@ -1,6 +1,14 @@
 import gradio as gr
 from groq_functions import groq_models, clear_conversation
-from mysql_functions import *
+from mysql_functions import (
+    analyser_import, changer_page, etat_serveur, executer_requete_avec_format, exporter_resultat,
+    get_db_schema, groq_chat_interface, lancer_import, schema_and_reset_chat, surveiller_profil, tables_import,
+    update_db_list
+)
+from async_pipeline import db_handler, job_handler
+from bulk_import import IMPORT_BATCH_SIZE, MODE_INSERT, MODE_LOAD_DATA
+from metrics import CHAT_TIMING_FOOTER
+from result_export import FORMATS as EXPORT_FORMATS
 
 def create_interface():
     with gr.Blocks(title="Groq + MySQL Assistant") as app:
@@ -15,10 +23,13 @@ def create_interface():
 
             with gr.Row():
                 with gr.Column(scale=1):
-                    api_key = gr.Textbox(label="Clé API Groq", type="password")
+                    api_key = gr.Textbox(label="Clé API Groq", type="password", info="Plusieurs clés séparées par des virgules sont utilisées à tour de rôle")
                     model = gr.Dropdown(choices=groq_models, value="llama-3.1-8b-instant", label="Modèle")
                     temperature = gr.Slider(minimum=0.0, maximum=1.0, value=0.7, step=0.1, label="Température")
                     auto_execute = gr.Checkbox(label="Exécuter automatiquement les requêtes SQL", value=True)
+                    stream = gr.Checkbox(label="Afficher la réponse au fil de l'eau (streaming)", value=True)
+                    hedge = gr.Checkbox(label="Mode couverture : modèle rapide + modèle fort, le premier SQL valide l'emporte", value=False)
+                    timings = gr.Checkbox(label="Afficher le temps de chaque étape sous la réponse", value=CHAT_TIMING_FOOTER)
                     
                     # Nouveaux champs pour personnaliser le rôle et les règles
                     with gr.Accordion("🎭 Personnalisation du rôle et des règles", open=False):
@@ -43,13 +54,27 @@ def create_interface():
                     chatbot = gr.Chatbot(label="Conversation", height=400, bubble_full_width=False)
                     msg = gr.Textbox(label="Votre question", lines=2, placeholder="Ex: Montre-moi tous les utilisateurs ou 'structure' pour voir les tables")
                     submit_btn = gr.Button("Envoyer")
+                    with gr.Accordion("📊 Dernier résultat", open=False):
+                        chat_page_info = gr.Markdown("")
+                        chat_result_df = gr.Dataframe(label="Résultat de la dernière requête", interactive=False, wrap=True)
+                        chat_page = gr.State(0)
+                        with gr.Row():
+                            chat_prev_btn = gr.Button("◀ Page précédente")
+                            chat_next_btn = gr.Button("Page suivante ▶")
+                        with gr.Row():
+                            chat_export_format = gr.Radio(choices=list(EXPORT_FORMATS), value="CSV", label="Format d'export")
+                            chat_export_btn = gr.Button("💾 Exporter")
+                        chat_export_statut = gr.Markdown("")
+                        chat_export_file = gr.File(label="Fichier exporté", interactive=False)
 
             # Fonction pour appliquer les nouveaux paramètres
+            @db_handler
             def apply_custom_settings(role, rules, mysql_conf):
                 schema_text = ""
                 if mysql_conf and mysql_conf.get("host") and mysql_conf.get("user") and mysql_conf.get("db_name"):
                     schema_text = get_db_schema(mysql_conf["host"], mysql_conf["user"], mysql_conf["password"], mysql_conf["db_name"])
                 
+                surveiller_profil(mysql_conf)
                 new_conversation = clear_conversation(schema_text, role, rules)
                 return new_conversation, role, rules
 
@@ -61,21 +86,42 @@ def create_interface():
 
             submit_btn.click(
                 fn=groq_chat_interface,
-                inputs=[msg, chatbot, api_key, model, temperature, conversation_state, auto_execute, mysql_config],
-                outputs=[chatbot, conversation_state]
+                inputs=[msg, chatbot, api_key, model, temperature, conversation_state, auto_execute, mysql_config, stream, hedge, timings],
+                outputs=[chatbot, conversation_state, chat_result_df, chat_page_info, chat_page]
             ).then(lambda _: "", inputs=[msg], outputs=[msg])
 
             msg.submit(
                 fn=groq_chat_interface,
-                inputs=[msg, chatbot, api_key, model, temperature, conversation_state, auto_execute, mysql_config],
-                outputs=[chatbot, conversation_state]
+                inputs=[msg, chatbot, api_key, model, temperature, conversation_state, auto_execute, mysql_config, stream, hedge, timings],
+                outputs=[chatbot, conversation_state, chat_result_df, chat_page_info, chat_page]
             ).then(lambda _: "", inputs=[msg], outputs=[msg])
 
+            @db_handler
+            def chat_page_precedente(numero, request: gr.Request):
+                info, df, _, numero = changer_page("chat", numero - 1, request)
+                return info, df, numero
+
+            @db_handler
+            def chat_page_suivante(numero, request: gr.Request):
+                info, df, _, numero = changer_page("chat", numero + 1, request)
+                return info, df, numero
+
+            chat_prev_btn.click(chat_page_precedente, inputs=[chat_page], outputs=[chat_page_info, chat_result_df, chat_page])
+            chat_next_btn.click(chat_page_suivante, inputs=[chat_page], outputs=[chat_page_info, chat_result_df, chat_page])
+
+            @job_handler
+            def chat_exporter(format_export, request: gr.Request, progress=gr.Progress()):
+                return exporter_resultat("chat", format_export, request, progress)
+
+            chat_export_btn.click(chat_exporter, inputs=[chat_export_format], outputs=[chat_export_file, chat_export_statut])
+
+            @db_handler
             def clear_chat_with_custom_settings(role, rules, mysql_conf):
                 schema_text = ""
                 if mysql_conf and mysql_conf.get("host") and mysql_conf.get("user") and mysql_conf.get("db_name"):
                     schema_text = get_db_schema(mysql_conf["host"], mysql_conf["user"], mysql_conf["password"], mysql_conf["db_name"])
                 
+                surveiller_profil(mysql_conf)
                 new_conversation = clear_conversation(schema_text, role, rules)
                 return [], new_conversation
 
@@ -94,18 +140,25 @@ def create_interface():
                 host = gr.Textbox(label="Hôte", value="localhost")
                 user = gr.Textbox(label="Utilisateur")
                 password = gr.Textbox(label="Mot de passe", type="password")
+            with gr.Accordion("🔀 Réplique en lecture (optionnelle)", open=False):
+                gr.Markdown("Les lectures (SELECT) sont envoyées à la réplique, les écritures au serveur principal.")
+                with gr.Row():
+                    replica_host = gr.Textbox(label="Hôte de la réplique", placeholder="Vide = serveur principal")
+                    replica_user = gr.Textbox(label="Utilisateur (vide = le même)")
+                    replica_password = gr.Textbox(label="Mot de passe (vide = le même)", type="password")
             btn = gr.Button("Lister les bases")
             db_list = gr.Dropdown(label="Bases disponibles", choices=[], interactive=True)
             schema_box = gr.Textbox(label="Structure de la base", lines=12, interactive=False)
 
-            btn.click(update_db_list, inputs=[host, user, password], outputs=db_list)
+            btn.click(db_handler(update_db_list), inputs=[host, user, password], outputs=db_list)
             
-            def schema_and_reset_with_stored_settings(host, user, password, db_name, role, rules):
-                return schema_and_reset_chat(host, user, password, db_name, role, rules)
+            @db_handler
+            def schema_and_reset_with_stored_settings(host, user, password, db_name, role, rules, r_host, r_user, r_password):
+                return schema_and_reset_chat(host, user, password, db_name, role, rules, r_host, r_user, r_password)
             
             db_list.change(
                 schema_and_reset_with_stored_settings, 
-                inputs=[host, user, password, db_list, stored_custom_role, stored_custom_rules], 
+                inputs=[host, user, password, db_list, stored_custom_role, stored_custom_rules, replica_host, replica_user, replica_password], 
                 outputs=[schema_box, conversation_state, mysql_config]
             )
 
@@ -113,11 +166,72 @@ def create_interface():
             requete = gr.Textbox(label="Requête SQL", lines=3, placeholder="SELECT * FROM ma_table;")
             exec_btn = gr.Button("Exécuter")
             resultat = gr.Markdown(label="Résultat", value="")
+            resultat_df = gr.Dataframe(label="Lignes", interactive=False, wrap=True)
+            resultat_page = gr.State(0)
+            with gr.Row():
+                prev_btn = gr.Button("◀ Page précédente")
+                next_btn = gr.Button("Page suivante ▶")
+            with gr.Row():
+                export_format = gr.Radio(choices=list(EXPORT_FORMATS), value="CSV", label="Format d'export")
+                export_btn = gr.Button("💾 Exporter")
+            export_statut = gr.Markdown("")
+            export_file = gr.File(label="Fichier exporté", interactive=False)
+            with gr.Accordion("📈 Statistiques par colonne (page affichée)", open=False):
+                resume_df = gr.Dataframe(label="Résumé des lignes de la page affichée", interactive=False)
 
             exec_btn.click(
-                executer_requete_avec_format,
-                inputs=[host, user, password, db_list, requete],
-                outputs=resultat
+                db_handler(executer_requete_avec_format),
+                inputs=[host, user, password, db_list, requete, replica_host, replica_user, replica_password],
+                outputs=[resultat, resultat_df, resume_df, resultat_page]
+            )
+
+            @db_handler
+            def mysql_page_precedente(numero, request: gr.Request):
+                return changer_page("mysql", numero - 1, request)
+
+            @db_handler
+            def mysql_page_suivante(numero, request: gr.Request):
+                return changer_page("mysql", numero + 1, request)
+
+            prev_btn.click(mysql_page_precedente, inputs=[resultat_page], outputs=[resultat, resultat_df, resume_df, resultat_page])
+            next_btn.click(mysql_page_suivante, inputs=[resultat_page], outputs=[resultat, resultat_df, resume_df, resultat_page])
+
+            @job_handler
+            def mysql_exporter(format_export, request: gr.Request, progress=gr.Progress()):
+                return exporter_resultat("mysql", format_export, request, progress)
+
+            export_btn.click(mysql_exporter, inputs=[export_format], outputs=[export_file, export_statut])
+
+            gr.Markdown("### 📥 Importer un fichier CSV / Excel")
+            with gr.Row():
+                import_fichier = gr.File(label="Fichier", file_types=[".csv", ".xlsx"], type="filepath")
+                with gr.Column():
+                    import_table = gr.Dropdown(label="Table cible", choices=[], interactive=True)
+                    import_mode = gr.Radio(choices=[MODE_INSERT, MODE_LOAD_DATA], value=MODE_INSERT, label="Méthode de chargement")
+                    import_batch = gr.Number(label="Lignes par lot (une transaction par lot)", value=IMPORT_BATCH_SIZE, precision=0)
+            analyse_btn = gr.Button("🔍 Analyser le fichier")
+            import_info = gr.Markdown("")
+            import_apercu = gr.Dataframe(label="Aperçu", interactive=False, wrap=True)
+            import_mapping = gr.Dataframe(label="Correspondance des colonnes", headers=["Colonne du fichier", "Colonne de la table"],
+                                          col_count=(2, "fixed"), interactive=True)
+            import_btn = gr.Button("📥 Importer")
+            import_statut = gr.Markdown("")
+
+            db_list.change(db_handler(tables_import), inputs=[host, user, password, db_list], outputs=[import_table])
+            analyse_btn.click(
+                db_handler(analyser_import),
+                inputs=[host, user, password, db_list, import_fichier, import_table],
+                outputs=[import_info, import_apercu, import_mapping]
             )
+            import_btn.click(
+                job_handler(lancer_import),
+                inputs=[host, user, password, db_list, import_fichier, import_table, import_mapping, import_batch, import_mode],
+                outputs=[import_statut]
+            )
+
+            with gr.Accordion("⏱️ Charge du serveur", open=False):
+                etat = gr.Markdown("")
+                etat_btn = gr.Button("🔄 Rafraîchir")
+            etat_btn.click(etat_serveur, outputs=[etat])
 
     return app
\ No newline at end of file
@@ -0,0 +1,103 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+from mysql_pool import connexion
+from schema_cache import get_schema_model, seed_schema
+
+# Instantané côté serveur de la dernière base chargée (hôte, utilisateur, base, modèle du schéma), relu au
+# démarrage pour amorcer le cache de schéma et, avec le mot de passe, le pool ; jamais renvoyé à l'interface.
+# Vide = désactivé
+WARM_START_FILE = os.environ.get("WARM_START_FILE", os.path.join(tempfile.gettempdir(), "groq_mysql_warm_start.json"))
+# Le mot de passe MySQL n'est écrit sur disque que sur demande explicite ; sans lui, pas de revalidation de fond
+WARM_START_SAVE_PASSWORD = os.environ.get("WARM_START_SAVE_PASSWORD", "0") == "1"
+
+_lock = threading.Lock()
+_snapshot = {}
+
+
+def load():
+    """Lire l'instantané et amorcer le cache de schéma ; retourne l'instantané (vide si absent)"""
+    global _snapshot
+    if not WARM_START_FILE:
+        return {}
+    try:
+        with open(WARM_START_FILE, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get("host") and data.get("db_name") and data.get("schema_model"):
+        try:
+            seed_schema(data["host"], data["db_name"], data["schema_model"])
+        except (KeyError, TypeError, AttributeError):
+            # Instantané d'un format antérieur : ignoré
+            data.pop("schema_model", None)
+    with _lock:
+        _snapshot = data
+    return dict(data)
+
+
+def current():
+    with _lock:
+        return dict(_snapshot)
+
+
+def _write(data):
+    tmp = WARM_START_FILE + ".tmp"
+    try:
+        # Écriture atomique, fichier lisible par le seul utilisateur courant
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(json.dumps(data, ensure_ascii=False, default=str))
+        os.replace(tmp, WARM_START_FILE)
+    except OSError:
+        pass
+
+
+def save(**fields):
+    """Mettre à jour l'instantané. Un changement d'hôte ou d'utilisateur efface la base et le schéma retenus"""
+    if not WARM_START_FILE:
+        return
+    if not WARM_START_SAVE_PASSWORD:
+        fields.pop("password", None)
+    with _lock:
+        for champ in ("host", "user"):
+            if champ in fields and fields[champ] != _snapshot.get(champ):
+                _snapshot.pop("db_name", None)
+                _snapshot.pop("schema_model", None)
+        _snapshot.update(fields)
+        _snapshot["saved_at"] = time.time()
+        _write(_snapshot)
+
+
+def revalidate():
+    """Revalider l'instantané en tâche de fond : existence de la base et empreinte du schéma.
+
+    Ouvre au passage les premières connexions du pool. Sans mot de passe
+    enregistré, le schéma amorcé est revalidé au premier accès par empreinte.
+    """
+    snap = current()
+    if not (snap.get("host") and snap.get("user")) or snap.get("password") is None:
+        return None
+
+    def run():
+        host, user, password, db_name = snap["host"], snap["user"], snap["password"], snap.get("db_name")
+        try:
+            with connexion(host, user, password) as conn:
+                cur = conn.cursor()
+                cur.execute("SHOW DATABASES;")
+                databases = [row[0] for row in cur.fetchall()]
+                cur.close()
+            if db_name in databases:
+                save(schema_model=get_schema_model(host, user, password, db_name, recheck=True))
+            elif db_name:
+                # Base supprimée depuis l'instantané
+                save(db_name=None, schema_model=None)
+        except Exception:
+            pass
+
+    thread = threading.Thread(target=run, name="warm-start", daemon=True)
+    thread.start()
+    return thread